@@ -9,6 +9,7 @@ from routes.s3select import s3_select_bp
 from routes.manage_sts_permission import manage_bp
 from routes.manage_roles import manage_iam_bp
 from routes.assume_roles import assume_bp
+from routes.jobs_routes import jobs_bp
 
 
 def create_app():
@@ -25,6 +26,7 @@ def create_app():
     app.register_blueprint(manage_bp)
     app.register_blueprint(manage_iam_bp)
     app.register_blueprint(assume_bp)
+    app.register_blueprint(jobs_bp)
     @app.errorhandler(403)
     def forbidden_error(error):
         user_info = get_user_type(
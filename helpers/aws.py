@@ -1,7 +1,29 @@
-import boto3, json
+import json
+import os
+import threading
+import time
 from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor, wait
+from cachetools import TTLCache
 from botocore.exceptions import NoCredentialsError, PartialCredentialsError, ClientError
 from flask import session
+from helpers.clients import get_client, secret_digest
+from helpers.dashboard import get_bucket_usage
+from helpers.usage_providers import probe_in_background
+
+USER_TYPE_CACHE_TTL = int(os.getenv("USER_TYPE_CACHE_TTL", "300"))
+BUCKET_INFO_WORKERS = int(os.getenv("BUCKET_INFO_WORKERS", "16"))
+BUCKET_INFO_CALL_TIMEOUT = int(os.getenv("BUCKET_INFO_CALL_TIMEOUT", "10"))
+BUCKET_INFO_DEADLINE = int(os.getenv("BUCKET_INFO_DEADLINE", "60"))
+BUCKET_INVENTORY_TTL = int(os.getenv("BUCKET_INVENTORY_TTL", "300"))
+
+# Identity lookups shared by all blueprints, keyed per credential set.
+_user_type_cache = TTLCache(maxsize=1024, ttl=USER_TYPE_CACHE_TTL)
+_user_type_lock = threading.Lock()
+
+# Server-side bucket inventory: (access_key, endpoint_url) -> (expires_at, buckets_info)
+_inventory = {}
+_inventory_lock = threading.Lock()
 
 def is_valid_url(url):
     try:
@@ -16,15 +38,18 @@ def check_credentials(access_key=None, secret_key=None, endpoint_url=None, regio
         return False, "Endpoint URL is invalid!, please use http or https"
 
     try:
-        boto_sess = boto3.Session(
-            aws_access_key_id=access_key,
-            aws_secret_access_key=secret_key,
-        ) if access_key and secret_key else boto3.Session()
-
-        iam = boto_sess.client("iam", endpoint_url=endpoint_url, region_name=region_name)
+        iam = get_client(
+            "iam",
+            aws_access_key_id=access_key if access_key and secret_key else None,
+            aws_secret_access_key=secret_key if access_key and secret_key else None,
+            endpoint_url=endpoint_url,
+            region_name=region_name
+        )
 
         resp = iam.get_user()
         user = resp.get("User", {})
+        # Detect native usage statistics off the login request; the refresher probes lazily otherwise
+        probe_in_background(access_key, secret_key, endpoint_url)
         return True, {
             "UserName": user.get("UserName"),
             "UserId": user.get("UserId"),
@@ -46,7 +71,7 @@ def check_credentials(access_key=None, secret_key=None, endpoint_url=None, regio
 
 
 def get_s3_client():
-    return boto3.client(
+    return get_client(
         "s3",
         aws_access_key_id=session.get("access_key"),
         aws_secret_access_key=session.get("secret_key"),
@@ -54,94 +79,269 @@ def get_s3_client():
     )
 
 
-def get_buckets_info():
-    if session.get("buckets_info"):
-        return session["buckets_info"]
+def _get_bucket_size(bucket_name):
+    # Read from the usage index the dashboard keeps, instead of listing the bucket
+    size = get_bucket_usage(bucket_name)["size"]
+    return {"Size": float(f"{size / (1024 * 1024):.3f}")}
 
-    s3_client = get_s3_client()
-    buckets_info = []
-    response = s3_client.list_buckets()
 
-    for bucket in response["Buckets"]:
-        bucket_name = bucket["Name"]
-        total_size = 0
+def _get_bucket_region(s3_client, bucket_name):
+    try:
+        location = s3_client.get_bucket_location(Bucket=bucket_name)
+        return {"Region": location.get("LocationConstraint")}
+    except:
+        return {"Region": None}
 
-        paginator = s3_client.get_paginator('list_objects_v2')
-        for page in paginator.paginate(Bucket=bucket_name):
-            if "Contents" in page:
-                total_size += sum(obj["Size"] for obj in page["Contents"])
 
-        bucket_data = {
-            "Name": bucket_name,
-            "CreationDate": bucket["CreationDate"].isoformat(),
-            "Owner": response.get("Owner", {}).get("ID"),
-            "Size": float(f"{total_size / (1024 * 1024):.3f}")
+def _get_bucket_policy(s3_client, bucket_name):
+    try:
+        policy = s3_client.get_bucket_policy(Bucket=bucket_name)
+        return {"Policy": json.loads(policy["Policy"])}
+    except:
+        return {"Policy": None}
+
+
+def _get_bucket_acl(s3_client, bucket_name):
+    try:
+        acl = s3_client.get_bucket_acl(Bucket=bucket_name)
+        return {"ACL": acl["Grants"][0]["Permission"]}
+    except:
+        return {"ACL": None}
+
+
+def _get_bucket_tags(s3_client, bucket_name):
+    try:
+        tags = s3_client.get_bucket_tagging(Bucket=bucket_name)
+        return {"Tags": tags.get("TagSet", [])}
+    except:
+        return {"Tags": []}
+
+
+def _get_bucket_versioning(s3_client, bucket_name):
+    # Versioning + MFA
+    try:
+        versioning = s3_client.get_bucket_versioning(Bucket=bucket_name)
+        return {
+            "Versioning": versioning.get("Status") == "Enabled",
+            "MFADelete": versioning.get("MFADelete") == "Enabled"
         }
+    except:
+        return {"Versioning": False, "MFADelete": False}
 
-        # Region
-        try:
-            location = s3_client.get_bucket_location(Bucket=bucket_name)
-            bucket_data["Region"] = location.get("LocationConstraint")
-        except:
-            bucket_data["Region"] = None
 
-        # Policy
-        try:
-            policy = s3_client.get_bucket_policy(Bucket=bucket_name)
-            bucket_data["Policy"] = json.loads(policy["Policy"])
-        except:
-            bucket_data["Policy"] = None
+def _get_bucket_replication(s3_client, bucket_name):
+    try:
+        replication = s3_client.get_bucket_replication(Bucket=bucket_name)
+        return {"Replication": replication.get("ReplicationConfiguration", {})}
+    except:
+        return {"Replication": None}
 
-        # ACL
-        try:
-            acl = s3_client.get_bucket_acl(Bucket=bucket_name)
-            bucket_data["ACL"] = acl["Grants"][0]["Permission"]
-        except:
-            bucket_data["ACL"] = None
 
-        # Tags
-        try:
-            tags = s3_client.get_bucket_tagging(Bucket=bucket_name)
-            bucket_data["Tags"] = tags.get("TagSet", [])
-        except:
-            bucket_data["Tags"] = []
+def _get_bucket_lifecycle(s3_client, bucket_name):
+    try:
+        lifecycle = s3_client.get_bucket_lifecycle_configuration(Bucket=bucket_name)
+        return {"Lifecycle": lifecycle.get("Rules", [])}
+    except ClientError:
+        return {"Lifecycle": []}
+
+
+# field group -> (fetcher, value used when the call fails or times out)
+BUCKET_INFO_FETCHERS = {
+    "Region": (_get_bucket_region, {"Region": None}),
+    "Policy": (_get_bucket_policy, {"Policy": None}),
+    "ACL": (_get_bucket_acl, {"ACL": None}),
+    "Tags": (_get_bucket_tags, {"Tags": []}),
+    "Versioning": (_get_bucket_versioning, {"Versioning": False, "MFADelete": False}),
+    "Replication": (_get_bucket_replication, {"Replication": None}),
+    "Lifecycle": (_get_bucket_lifecycle, {"Lifecycle": []}),
+}
+# "Size" comes from the local usage index rather than an S3 call
+BUCKET_INFO_FIELDS = ["Size"] + list(BUCKET_INFO_FETCHERS)
+
+
+def _get_bucket_info_client():
+    return get_client(
+        "s3",
+        aws_access_key_id=session.get("access_key"),
+        aws_secret_access_key=session.get("secret_key"),
+        endpoint_url=session.get("endpoint_url"),
+        connect_timeout=BUCKET_INFO_CALL_TIMEOUT,
+        read_timeout=BUCKET_INFO_CALL_TIMEOUT,
+        retries={"max_attempts": 2},
+        max_pool_connections=BUCKET_INFO_WORKERS
+    )
 
-        # Versioning + MFA
-        try:
-            versioning = s3_client.get_bucket_versioning(Bucket=bucket_name)
-            bucket_data["Versioning"] = versioning.get("Status") == "Enabled"
-            bucket_data["MFADelete"] = versioning.get("MFADelete") == "Enabled"
-        except:
-            bucket_data["Versioning"] = False
-            bucket_data["MFADelete"] = False
-
-        # Replication
-        try:
-            replication = s3_client.get_bucket_replication(Bucket=bucket_name)
-            bucket_data["Replication"] = replication.get("ReplicationConfiguration", {})
-        except:
-            bucket_data["Replication"] = None
-        
-        # Lifecycle
 
-        try:
-            lifecycle = s3_client.get_bucket_lifecycle_configuration(Bucket=bucket_name)
-            bucket_data["Lifecycle"] = lifecycle.get("Rules", [])
-        except ClientError as e:
-            code = e.response.get("Error", {}).get("Code")
-            if code in ("NoSuchLifecycleConfiguration", "404"):
-                bucket_data["Lifecycle"] = []
-            else:
-                bucket_data["Lifecycle"] = []
+def fetch_bucket_info(s3_client, bucket_names, fields=None):
+    """
+    Fetch bucket configuration for many buckets on a bounded thread pool.
 
+    Every (bucket, field) call runs concurrently. Calls that fail or are still
+    running when BUCKET_INFO_DEADLINE expires fall back to their default value
+    and the bucket is flagged with "Partial": True, with the failed fields in
+    "PartialFields". Sizes are read from the usage index in the request thread.
+    Returns {bucket_name: {field: value, ...}}.
+    """
+    fields = fields or BUCKET_INFO_FIELDS
+    results = {name: {} for name in bucket_names}
+
+    if "Size" in fields:
+        for name in bucket_names:
+            try:
+                results[name].update(_get_bucket_size(name))
+            except Exception as e:
+                print(f"Error reading usage of bucket {name}: {e}")
+                results[name].update({"Size": 0.0, "Partial": True, "PartialFields": ["Size"]})
+
+    pool = ThreadPoolExecutor(max_workers=BUCKET_INFO_WORKERS)
+    futures = {}
+    for name in bucket_names:
+        for field in fields:
+            if field in BUCKET_INFO_FETCHERS:
+                futures[pool.submit(BUCKET_INFO_FETCHERS[field][0], s3_client, name)] = (name, field)
+
+    done, _ = wait(futures, timeout=BUCKET_INFO_DEADLINE)
+    pool.shutdown(wait=False, cancel_futures=True)
+
+    for future, (name, field) in futures.items():
+        if future in done and future.exception() is None:
+            results[name].update(future.result())
+        else:
+            results[name].update(BUCKET_INFO_FETCHERS[field][1])
+            results[name]["Partial"] = True
+            results[name]["PartialFields"] = results[name].get("PartialFields", []) + [field]
+    return results
+
+
+def _inventory_key():
+    return session.get("access_key"), session.get("endpoint_url")
+
+
+def _cached_inventory(key):
+    with _inventory_lock:
+        entry = _inventory.get(key)
+    if entry and entry[0] > time.monotonic():
+        return entry[1]
+    return None
+
+
+def _store_inventory(key, buckets_info, expires_at=None):
+    now = time.monotonic()
+    with _inventory_lock:
+        for k in [k for k, (exp, _) in _inventory.items() if exp <= now]:
+            del _inventory[k]
+        _inventory[key] = (expires_at or now + BUCKET_INVENTORY_TTL, buckets_info)
+
+
+def get_buckets_info(refresh=False):
+    """Return the bucket inventory of the session's account from the server-side cache."""
+    # Inventories used to live in the cookie session; drop leftovers from old sessions
+    session.pop("buckets_info", None)
+
+    key = _inventory_key()
+    if not refresh:
+        cached = _cached_inventory(key)
+        if cached is not None:
+            return cached
+
+    s3_client = _get_bucket_info_client()
+    response = s3_client.list_buckets()
+    buckets = response["Buckets"]
+    details = fetch_bucket_info(s3_client, [b["Name"] for b in buckets])
+
+    buckets_info = []
+    for bucket in buckets:
+        bucket_data = {
+            "Name": bucket["Name"],
+            "CreationDate": bucket["CreationDate"].isoformat(),
+            "Owner": response.get("Owner", {}).get("ID"),
+            "Partial": False
+        }
+        bucket_data.update(details[bucket["Name"]])
         buckets_info.append(bucket_data)
 
-    session["buckets_info"] = buckets_info
+    _store_inventory(key, buckets_info)
     return buckets_info
 
 
+def refresh_bucket_info(bucket_name, fields=None):
+    """
+    Re-fetch the given fields of one bucket and update only its cached entry.
+
+    Unknown buckets (e.g. just created) are fetched in full and added. The
+    "Partial" flag is cleared once every field that had fallen back has been
+    fetched again. Nothing happens when the account has no cached inventory yet.
+    """
+    key = _inventory_key()
+    with _inventory_lock:
+        entry = _inventory.get(key)
+    if not entry:
+        return
+    expires_at, cached = entry
+
+    s3_client = _get_bucket_info_client()
+    if any(b["Name"] == bucket_name for b in cached):
+        refreshed = fields or BUCKET_INFO_FIELDS
+        details = fetch_bucket_info(s3_client, [bucket_name], refreshed)[bucket_name]
+        buckets_info = []
+        for b in cached:
+            if b["Name"] == bucket_name:
+                stale = [f for f in b.get("PartialFields", []) if f not in refreshed]
+                partial_fields = stale + details.get("PartialFields", [])
+                b = dict(b, **details)
+                b.update(Partial=bool(partial_fields), PartialFields=partial_fields)
+            buckets_info.append(b)
+    else:
+        response = s3_client.list_buckets()
+        bucket = next((b for b in response["Buckets"] if b["Name"] == bucket_name), None)
+        if bucket is None:
+            return
+        bucket_data = {
+            "Name": bucket_name,
+            "CreationDate": bucket["CreationDate"].isoformat(),
+            "Owner": response.get("Owner", {}).get("ID"),
+            "Partial": False
+        }
+        bucket_data.update(fetch_bucket_info(s3_client, [bucket_name])[bucket_name])
+        buckets_info = cached + [bucket_data]
+
+    _store_inventory(key, buckets_info, expires_at)
+
+
+def drop_bucket_info(bucket_name):
+    """Remove a deleted bucket from the cached inventory."""
+    key = _inventory_key()
+    with _inventory_lock:
+        entry = _inventory.get(key)
+    if entry:
+        _store_inventory(key, [b for b in entry[1] if b["Name"] != bucket_name], entry[0])
+
+
 def get_user_type(access_key, secret_key, endpoint_url, region_name=""):
-    iam_client = boto3.client(
+    """Return the caller's identity, resolved with IAM GetUser at most once per cache TTL."""
+    key = (access_key, endpoint_url, region_name, secret_digest(secret_key))
+    with _user_type_lock:
+        cached = _user_type_cache.get(key)
+    if cached is not None:
+        return dict(cached)
+
+    user_info = _fetch_user_type(access_key, secret_key, endpoint_url, region_name)
+    # Unknown results come from transient errors and are retried on the next call
+    if user_info.get("type") != "Unknown":
+        with _user_type_lock:
+            _user_type_cache[key] = dict(user_info)
+    return user_info
+
+
+def invalidate_user_type(access_key, endpoint_url):
+    """Drop cached identities of an access key, e.g. on logout."""
+    with _user_type_lock:
+        for key in [k for k in _user_type_cache if k[0] == access_key and k[1] == endpoint_url]:
+            _user_type_cache.pop(key, None)
+
+
+def _fetch_user_type(access_key, secret_key, endpoint_url, region_name=""):
+    iam_client = get_client(
         "iam",
         aws_access_key_id=access_key,
         aws_secret_access_key=secret_key,
@@ -168,55 +368,15 @@ def get_user_type(access_key, secret_key, endpoint_url, region_name=""):
         return {"type": "Unknown", "error": str(e)}
 
 
-def list_iam_users(access_key_id, secret_access_key, endpoint_url, session_token=None):
-    users_info = []
-    try:
-        client = boto3.client(
-            "iam",
-            aws_access_key_id=access_key_id,
-            aws_secret_access_key=secret_access_key,
-            aws_session_token=session_token,
-            endpoint_url=endpoint_url,
-            region_name="us-east-1"
-        )
-
-        paginator = client.get_paginator("list_users")
-        for page in paginator.paginate():
-            for u in page.get("Users", []):
-                username = u.get("UserName")
-                arn = u.get("Arn")
-                created = u.get("CreateDate")
-
-                try:
-                    groups_resp = client.list_groups_for_user(UserName=username)
-                    groups = [g["GroupName"] for g in groups_resp.get("Groups", [])]
-                except ClientError:
-                    groups = []
-
-                users_info.append({
-                    "UserName": username,
-                    "Arn": arn,
-                    "Created": str(created),
-                    "Groups": groups if groups else ["No Groups"]
-                })
-
-    except NoCredentialsError:
-        return [{"Error": "Credentials not found or invalid."}]
-    except ClientError as e:
-        return [{"Error": f"AWS client error: {str(e)}"}]
-
-    return users_info
-
-
 def create_iam_user(endpoint, access_key, secret_key, user_name, region=None):
-    session = boto3.session.Session(
+    iam = get_client(
+        "iam",
         aws_access_key_id=access_key,
         aws_secret_access_key=secret_key,
+        endpoint_url=endpoint,
         region_name=region
     )
 
-    iam = session.client("iam", endpoint_url=endpoint)
-
     try:
         response = iam.create_user(UserName=user_name)
 
@@ -242,8 +402,8 @@ def create_iam_user(endpoint, access_key, secret_key, user_name, region=None):
         }
 
 def _iam_client(access_key, secret_key, endpoint_url, region="us-east-1"):
-    """Internal helper to create IAM client"""
-    return boto3.client(
+    """Internal helper to get a pooled IAM client"""
+    return get_client(
         "iam",
         aws_access_key_id=access_key,
         aws_secret_access_key=secret_key,
@@ -311,7 +471,7 @@ def delete_access_key(access_key, secret_key, endpoint_url, username, key_id, re
 
 def delete_iam_user(endpoint, access_key, secret_key, user_name, region="us-east-1"):
     """Delete an IAM user"""
-    iam = boto3.client(
+    iam = get_client(
         "iam",
         aws_access_key_id=access_key,
         aws_secret_access_key=secret_key,
@@ -349,7 +509,7 @@ def create_bucket(endpoint, access_key, secret_key, bucket_name, region="us-east
     :param enable_locking: If True, enables Object Lock on bucket creation
     :return: dict with success status and message
     """
-    s3 = boto3.client(
+    s3 = get_client(
         "s3",
         aws_access_key_id=access_key,
         aws_secret_access_key=secret_key,
@@ -412,8 +572,8 @@ def create_bucket(endpoint, access_key, secret_key, bucket_name, region="us-east
 
 
 def get_iam_client(access_key=None, secret_key=None, endpoint_url=None, region_name="us-east-1"):
-    """Return a boto3 IAM client, using given credentials or default ones."""
-    return boto3.client(
+    """Return a pooled boto3 IAM client, using given credentials or default ones."""
+    return get_client(
         "iam",
         aws_access_key_id=access_key,
         aws_secret_access_key=secret_key,
@@ -0,0 +1,27 @@
+# helpers/background.py
+import threading
+
+
+def start_periodic_worker(name, interval, target):
+    """
+    Run target() in a daemon thread every `interval` seconds.
+
+    If target() returns True it has more work pending and is called again
+    right away instead of waiting. Returns an Event that can be set to wake
+    the worker early.
+    """
+    wake = threading.Event()
+
+    def loop():
+        while True:
+            more = False
+            try:
+                more = target()
+            except Exception as e:
+                print(f"Error in background worker {name}: {e}")
+            if not more:
+                wake.wait(interval)
+            wake.clear()
+
+    threading.Thread(target=loop, name=name, daemon=True).start()
+    return wake
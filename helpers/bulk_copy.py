@@ -0,0 +1,215 @@
+# helpers/bulk_copy.py
+import os
+import math
+from urllib.parse import urlencode
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from helpers.clients import get_client
+from helpers.jobs import register_job_kind
+from helpers.bulk_delete import delete_batch, DELETE_BATCH_SIZE, MAX_REPORTED_FAILURES
+from helpers.listing import iter_objects, LISTING_MAX_WORKERS
+
+COPY_MAX_WORKERS = int(os.getenv("COPY_MAX_WORKERS", "8"))
+COPY_PART_WORKERS = int(os.getenv("COPY_PART_WORKERS", "4"))
+COPY_MULTIPART_THRESHOLD = int(os.getenv("COPY_MULTIPART_THRESHOLD", str(5 * 1024 ** 3)))
+COPY_PART_SIZE = int(os.getenv("COPY_PART_SIZE", str(512 * 1024 ** 2)))
+COPY_RETRIES = int(os.getenv("COPY_RETRIES", "5"))
+MAX_MULTIPART_PARTS = 10000
+
+# Headers that CopyObject carries over with MetadataDirective=COPY and that a multipart copy must set itself
+_PRESERVED_HEADERS = ("ContentType", "ContentEncoding", "ContentLanguage", "ContentDisposition", "CacheControl", "Expires")
+
+
+def destination_key(key, source_prefix, dest_prefix):
+    """Key of a copied object: its path below source_prefix, re-rooted at dest_prefix."""
+    return dest_prefix + key[len(source_prefix):]
+
+
+def overlaps(source_bucket, source_prefix, dest_bucket, dest_prefix):
+    """True if the destination lies inside the source, so copies would be listed and copied again."""
+    return source_bucket == dest_bucket and dest_prefix.startswith(source_prefix)
+
+
+def _copy_source(bucket, key):
+    return {"Bucket": bucket, "Key": key}
+
+
+def _destination_params(head):
+    """Storage class and server-side encryption of the source, to be applied to its copy."""
+    params = {}
+    if head.get("StorageClass"):
+        params["StorageClass"] = head["StorageClass"]
+    if head.get("ServerSideEncryption"):
+        params["ServerSideEncryption"] = head["ServerSideEncryption"]
+        if head["ServerSideEncryption"] == "aws:kms" and head.get("SSEKMSKeyId"):
+            params["SSEKMSKeyId"] = head["SSEKMSKeyId"]
+    return params
+
+
+def _multipart_copy(s3, source_bucket, key, size, dest_bucket, dest_key, head):
+    """Copy an object too large for CopyObject with UploadPartCopy, carrying metadata, tags, storage class and encryption."""
+    params = {k: head[k] for k in _PRESERVED_HEADERS if head.get(k)}
+    params.update(_destination_params(head))
+    tags = s3.get_object_tagging(Bucket=source_bucket, Key=key).get("TagSet", [])
+    if tags:
+        params["Tagging"] = urlencode({t["Key"]: t["Value"] for t in tags})
+
+    upload_id = s3.create_multipart_upload(
+        Bucket=dest_bucket, Key=dest_key, Metadata=head.get("Metadata", {}), **params
+    )["UploadId"]
+
+    part_size = max(COPY_PART_SIZE, math.ceil(size / MAX_MULTIPART_PARTS))
+    ranges = [(start, min(start + part_size, size) - 1) for start in range(0, size, part_size)]
+
+    def copy_part(number, byte_range):
+        response = s3.upload_part_copy(
+            Bucket=dest_bucket,
+            Key=dest_key,
+            UploadId=upload_id,
+            PartNumber=number,
+            CopySource=_copy_source(source_bucket, key),
+            CopySourceRange=f"bytes={byte_range[0]}-{byte_range[1]}",
+            CopySourceIfMatch=head["ETag"]
+        )
+        return {"PartNumber": number, "ETag": response["CopyPartResult"]["ETag"]}
+
+    try:
+        with ThreadPoolExecutor(max_workers=COPY_PART_WORKERS) as executor:
+            parts = list(executor.map(copy_part, range(1, len(ranges) + 1), ranges))
+        s3.complete_multipart_upload(
+            Bucket=dest_bucket, Key=dest_key, UploadId=upload_id, MultipartUpload={"Parts": parts}
+        )
+    except Exception:
+        # Do not leave orphaned parts on the cluster
+        s3.abort_multipart_upload(Bucket=dest_bucket, Key=dest_key, UploadId=upload_id)
+        raise
+
+
+def copy_object(s3, source_bucket, key, size, dest_bucket, dest_key):
+    """
+    Copy one object server-side, keeping its metadata, tags, storage class and
+    SSE-S3/SSE-KMS encryption. Objects above COPY_MULTIPART_THRESHOLD (CopyObject
+    is limited to 5 GB) use UploadPartCopy.
+
+    ACLs are not copied: the copy gets the destination bucket's default
+    (owner full control), since source grants may name accounts that should
+    not gain access to the destination and many buckets disable ACLs.
+    SSE-C objects cannot be copied without their customer key.
+    """
+    head = s3.head_object(Bucket=source_bucket, Key=key)
+    if size > COPY_MULTIPART_THRESHOLD:
+        _multipart_copy(s3, source_bucket, key, size, dest_bucket, dest_key, head)
+    else:
+        s3.copy_object(
+            Bucket=dest_bucket,
+            Key=dest_key,
+            CopySource=_copy_source(source_bucket, key),
+            MetadataDirective="COPY",
+            TaggingDirective="COPY",
+            **_destination_params(head)
+        )
+
+
+def _copy_one(s3, source_bucket, obj, dest_bucket, dest_key):
+    """Return (key, size, error message or None)."""
+    try:
+        copy_object(s3, source_bucket, obj["Key"], obj.get("Size", 0), dest_bucket, dest_key)
+        return obj["Key"], obj.get("Size", 0), None
+    except Exception as e:
+        return obj["Key"], obj.get("Size", 0), str(e)
+
+
+def iter_source_objects(s3, bucket, prefix="", keys=None):
+    """Objects to copy: the given keys, or every object under the prefix (sharded listing, unordered)."""
+    if keys:
+        for key in keys:
+            head = s3.head_object(Bucket=bucket, Key=key)
+            yield {"Key": key, "Size": head.get("ContentLength", 0)}
+        return
+    yield from iter_objects(s3, bucket, prefix)
+
+
+def copy_prefix(s3, source_bucket, source_prefix, dest_bucket, dest_prefix,
+                keys=None, move=False, report=None, cancelled=None, max_workers=None):
+    """
+    Copy (or move) every object under source_prefix, or only `keys`, to dest_prefix in dest_bucket.
+
+    Copies run server-side on a pool of max_workers threads with at most
+    twice that many in flight; transient S3 errors are retried by the client.
+    With move=True each source object is deleted, in DeleteObjects batches,
+    only after its copy succeeded. report(listed=, copied=, bytes=, deleted=,
+    failed=, failures=) is called as copies complete.
+    """
+    max_workers = max_workers or COPY_MAX_WORKERS
+    state = {"listed": 0, "copied": 0, "bytes": 0, "deleted": 0, "failed": 0, "failures": []}
+    to_delete = []
+
+    def flush_deletes(force=False):
+        while to_delete and (force or len(to_delete) >= DELETE_BATCH_SIZE):
+            batch = to_delete[:DELETE_BATCH_SIZE]
+            del to_delete[:DELETE_BATCH_SIZE]
+            deleted, failures, failed = delete_batch(s3, source_bucket, batch)
+            state["deleted"] += deleted
+            state["failed"] += failed
+            add_failures(failures)
+
+    def add_failures(failures):
+        room = MAX_REPORTED_FAILURES - len(state["failures"])
+        if room > 0:
+            state["failures"].extend(failures[:room])
+
+    def collect(done):
+        for future in done:
+            key, size, error = future.result()
+            if error:
+                state["failed"] += 1
+                add_failures([{"Key": key, "Message": error}])
+                continue
+            state["copied"] += 1
+            state["bytes"] += size
+            if move:
+                to_delete.append({"Key": key})
+        flush_deletes()
+        if report:
+            report(**{**state, "failures": list(state["failures"])})
+
+    in_flight = set()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for obj in iter_source_objects(s3, source_bucket, source_prefix, keys):
+            if cancelled is not None and cancelled.is_set():
+                break
+            dest_key = destination_key(obj["Key"], source_prefix, dest_prefix)
+            if len(in_flight) >= max_workers * 2:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                collect(done)
+            state["listed"] += 1
+            in_flight.add(executor.submit(_copy_one, s3, source_bucket, obj, dest_bucket, dest_key))
+
+        while in_flight:
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            collect(done)
+
+    flush_deletes(force=True)
+    if report:
+        report(**{**state, "failures": list(state["failures"])})
+    return state
+
+
+def _copy_prefix_job(params, credentials, report, cancelled):
+    access_key, secret_key, endpoint_url = credentials
+    s3 = get_client(
+        "s3",
+        aws_access_key_id=access_key,
+        aws_secret_access_key=secret_key,
+        endpoint_url=endpoint_url,
+        region_name="default",
+        max_pool_connections=(COPY_MAX_WORKERS + COPY_PART_WORKERS) * 2 + LISTING_MAX_WORKERS,
+        retries={"max_attempts": COPY_RETRIES, "mode": "adaptive"}
+    )
+    state = copy_prefix(
+        s3, params["source_bucket"], params["source_prefix"], params["dest_bucket"], params["dest_prefix"],
+        keys=params.get("keys"), move=params.get("move", False), report=report, cancelled=cancelled
+    )
+    return {k: state[k] for k in ("listed", "copied", "bytes", "deleted", "failed")}
+
+
+register_job_kind("copy_prefix", _copy_prefix_job)
@@ -0,0 +1,125 @@
+# helpers/bulk_delete.py
+import os
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from helpers.clients import get_client
+from helpers.jobs import register_job_kind
+from helpers.listing import iter_objects, LISTING_MAX_WORKERS
+
+DELETE_BATCH_SIZE = 1000  # DeleteObjects limit
+DELETE_MAX_WORKERS = int(os.getenv("DELETE_MAX_WORKERS", "8"))
+MAX_REPORTED_FAILURES = 100
+
+
+def is_versioned(s3, bucket):
+    """True if versioning is or was enabled, i.e. old versions and delete markers may exist."""
+    status = s3.get_bucket_versioning(Bucket=bucket).get("Status")
+    return status in ("Enabled", "Suspended")
+
+
+def iter_delete_batches(s3, bucket, prefix="", versioned=False):
+    """
+    Yield lists of up to DELETE_BATCH_SIZE {"Key"[, "VersionId"]} entries under a prefix.
+    On versioned buckets every version and delete marker is included; those
+    are listed serially, other listings are sharded with helpers.listing.
+    """
+    batch = []
+    if versioned:
+        paginator = s3.get_paginator("list_object_versions")
+        for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+            for item in page.get("Versions", []) + page.get("DeleteMarkers", []):
+                batch.append({"Key": item["Key"], "VersionId": item["VersionId"]})
+                if len(batch) == DELETE_BATCH_SIZE:
+                    yield batch
+                    batch = []
+    else:
+        for item in iter_objects(s3, bucket, prefix):
+            batch.append({"Key": item["Key"]})
+            if len(batch) == DELETE_BATCH_SIZE:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+def delete_batch(s3, bucket, batch):
+    """Delete one batch with a single DeleteObjects call. Returns (deleted, failure details, failed)."""
+    try:
+        response = s3.delete_objects(Bucket=bucket, Delete={"Objects": batch, "Quiet": True})
+    except Exception as e:
+        # The whole request failed; report it once rather than once per key
+        return 0, [{"Key": batch[0]["Key"], "Code": "RequestFailed", "Message": f"{len(batch)} keys: {e}"}], len(batch)
+
+    errors = response.get("Errors", [])
+    failures = [{
+        "Key": err.get("Key"),
+        "VersionId": err.get("VersionId"),
+        "Code": err.get("Code"),
+        "Message": err.get("Message")
+    } for err in errors]
+    return len(batch) - len(errors), failures, len(errors)
+
+
+def delete_prefix(s3, bucket, prefix="", report=None, cancelled=None, max_workers=None):
+    """
+    Delete every object (and, on versioned buckets, every version and delete
+    marker) under a prefix; an empty prefix empties the bucket.
+
+    Listing runs in this thread while DeleteObjects batches run on a pool of
+    max_workers threads, with at most twice that many batches in flight.
+    report(listed=, deleted=, failed=, failures=) is called after every
+    batch; failures keeps the first MAX_REPORTED_FAILURES entries. Setting
+    the `cancelled` event stops the job after the batches in flight.
+    Returns the final counters as a dict.
+    """
+    max_workers = max_workers or DELETE_MAX_WORKERS
+    versioned = is_versioned(s3, bucket)
+    state = {"listed": 0, "deleted": 0, "failed": 0, "failures": [], "versioned": versioned}
+
+    def collect(done):
+        for future in done:
+            deleted, failures, failed = future.result()
+            state["deleted"] += deleted
+            state["failed"] += failed
+            room = MAX_REPORTED_FAILURES - len(state["failures"])
+            if room > 0:
+                state["failures"].extend(failures[:room])
+        if report:
+            report(**{**state, "failures": list(state["failures"])})
+
+    in_flight = set()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for batch in iter_delete_batches(s3, bucket, prefix, versioned):
+            if cancelled is not None and cancelled.is_set():
+                break
+            if len(in_flight) >= max_workers * 2:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                collect(done)
+            state["listed"] += len(batch)
+            in_flight.add(executor.submit(delete_batch, s3, bucket, batch))
+
+            done = {future for future in in_flight if future.done()}
+            if done:
+                in_flight -= done
+                collect(done)
+
+        while in_flight:
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            collect(done)
+    return state
+
+
+def _delete_prefix_job(params, credentials, report, cancelled):
+    access_key, secret_key, endpoint_url = credentials
+    s3 = get_client(
+        "s3",
+        aws_access_key_id=access_key,
+        aws_secret_access_key=secret_key,
+        endpoint_url=endpoint_url,
+        region_name="default",
+        max_pool_connections=DELETE_MAX_WORKERS * 2 + LISTING_MAX_WORKERS
+    )
+    state = delete_prefix(s3, params["bucket"], params["prefix"], report=report, cancelled=cancelled)
+    return {k: state[k] for k in ("listed", "deleted", "failed")}
+
+
+register_job_kind("delete_prefix", _delete_prefix_job)
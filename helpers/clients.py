@@ -0,0 +1,66 @@
+# helpers/clients.py
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+import boto3
+from botocore.config import Config
+
+CLIENT_POOL_SIZE = int(os.getenv("CLIENT_POOL_SIZE", "64"))
+MAX_POOL_CONNECTIONS = int(os.getenv("MAX_POOL_CONNECTIONS", "50"))
+TCP_KEEPALIVE = os.getenv("TCP_KEEPALIVE", "true").lower() in ("1", "true", "yes")
+
+# One botocore session for the whole process so service models are loaded once.
+_boto_session = boto3.session.Session()
+_clients = OrderedDict()
+_clients_lock = threading.Lock()
+
+
+def secret_digest(*secrets):
+    """Stable digest of secret material, used in cache keys instead of the secrets themselves."""
+    return hashlib.sha256("\0".join(s or "" for s in secrets).encode()).hexdigest()
+
+
+def get_client(service_name, aws_access_key_id=None, aws_secret_access_key=None,
+               aws_session_token=None, endpoint_url=None, region_name=None, **config_options):
+    """
+    Return a pooled boto3 client for the given service, credentials and endpoint.
+
+    Clients are kept in a bounded LRU pool keyed by (service, access key,
+    endpoint, region) so their HTTP connections are reused across requests.
+    Extra keyword arguments are passed to botocore's Config and may override
+    the pool defaults.
+    """
+    key = (
+        service_name,
+        aws_access_key_id,
+        endpoint_url,
+        region_name,
+        secret_digest(aws_secret_access_key, aws_session_token),
+        repr(sorted(config_options.items()))
+    )
+
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is not None:
+            _clients.move_to_end(key)
+            return client
+
+        config = Config(**{
+            "max_pool_connections": MAX_POOL_CONNECTIONS,
+            "tcp_keepalive": TCP_KEEPALIVE,
+            **config_options
+        })
+        client = _boto_session.client(
+            service_name,
+            aws_access_key_id=aws_access_key_id,
+            aws_secret_access_key=aws_secret_access_key,
+            aws_session_token=aws_session_token,
+            endpoint_url=endpoint_url,
+            region_name=region_name,
+            config=config
+        )
+        _clients[key] = client
+        while len(_clients) > CLIENT_POOL_SIZE:
+            _clients.popitem(last=False)
+    return client
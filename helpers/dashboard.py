@@ -1,11 +1,34 @@
 # helpers/dashboard.py
-import boto3
 import os
-from botocore.client import Config
+import time
+import threading
 from flask import session
+from helpers.clients import get_client
+from helpers import usage_index, usage_providers
+from helpers.background import start_periodic_worker
+from helpers.jobs import register_job_kind
 
-def get_s3_client(access_key=None, secret_key=None, endpoint_url=None):
+USAGE_REFRESH_INTERVAL = int(os.getenv("USAGE_REFRESH_INTERVAL", "300"))
+USAGE_PAGES_PER_STEP = int(os.getenv("USAGE_PAGES_PER_STEP", "50"))
+USAGE_TRACK_IDLE = int(os.getenv("USAGE_TRACK_IDLE", "1800"))
+
+# Accounts whose bucket usage is kept fresh by the background refresher:
+# (endpoint_url, access_key) -> (secret_key, last seen). Secrets are only held
+# in memory, never written to the usage index, and are dropped on logout or
+# after USAGE_TRACK_IDLE seconds without a request touching the account.
+_tracked_accounts = {}
+_tracked_lock = threading.Lock()
+_refresh_wake = None
+# Scan steps resume from a shared checkpoint, so the refresher and rescan jobs take turns
+_refresh_lock = threading.Lock()
+
+# Precomputed dashboard statistics: (endpoint_url, access_key) -> snapshot.
+# Waiters on the condition are woken whenever a snapshot's contents change.
+_snapshots = {}
+_snapshots_changed = threading.Condition()
 
+
+def _resolve_credentials(access_key=None, secret_key=None, endpoint_url=None):
     if access_key is None:
         try:
             access_key = session.get("access_key")
@@ -15,100 +38,255 @@ def get_s3_client(access_key=None, secret_key=None, endpoint_url=None):
             access_key = os.getenv('AWS_ACCESS_KEY_ID')
             secret_key = os.getenv('AWS_SECRET_ACCESS_KEY')
             endpoint_url = os.getenv('AWS_ENDPOINT_URL')
-    
+
     if not access_key or not secret_key:
         raise ValueError("AWS credentials not available")
-    
-    return boto3.client(
+
+    return access_key, secret_key, endpoint_url
+
+
+def get_s3_client(access_key=None, secret_key=None, endpoint_url=None):
+    access_key, secret_key, endpoint_url = _resolve_credentials(access_key, secret_key, endpoint_url)
+
+    return get_client(
         "s3",
         aws_access_key_id=access_key,
         aws_secret_access_key=secret_key,
         endpoint_url=endpoint_url,
-        config=Config(signature_version="s3v4"),
-        region_name="us-east-1"
+        region_name="us-east-1",
+        signature_version="s3v4"
     )
 
-def get_bucket_size_and_count(bucket_name, access_key=None, secret_key=None, endpoint_url=None):
+
+def _refresh_account_usage(access_key, secret_key, endpoint_url, max_age=None):
+    """Advance the usage scan of every stale bucket by one step. Returns True while scans are pending."""
+    with _refresh_lock:
+        return _refresh_step(access_key, secret_key, endpoint_url,
+                             USAGE_REFRESH_INTERVAL if max_age is None else max_age)
+
+
+def _refresh_step(access_key, secret_key, endpoint_url, max_age):
     s3 = get_s3_client(access_key, secret_key, endpoint_url)
-    total_size = 0
-    total_objects = 0
-    continuation_token = None
-    
-    try:
-        while True:
-            list_params = {'Bucket': bucket_name}
-            if continuation_token:
-                list_params['ContinuationToken'] = continuation_token
-            
-            response = s3.list_objects_v2(**list_params)
-            
-            if 'Contents' in response:
-                for obj in response['Contents']:
-                    total_size += obj.get("Size", 0)
-                    total_objects += 1
-            
-            if response.get("IsTruncated"):
-                continuation_token = response["NextContinuationToken"]
-            else:
-                break
-                
-    except Exception as e:
-        print(f"Error processing bucket {bucket_name}: {e}")
-    
-    return total_size, total_objects
+    bucket_names = [b["Name"] for b in s3.list_buckets().get("Buckets", [])]
+    usage_index.sync_buckets(access_key, endpoint_url, bucket_names)
+
+    # Backends that keep usage counters (RGW, MinIO) answer without listing a single object
+    native = {}
+    provider = usage_providers.get_usage_provider(access_key, secret_key, endpoint_url, bucket_names)
+    if provider != usage_providers.LISTING:
+        try:
+            native = usage_providers.fetch_usage(provider, access_key, secret_key, endpoint_url, bucket_names)
+        except Exception as e:
+            print(f"Error reading {provider} usage, falling back to listing: {e}")
+
+    pending = False
+    for name, row in usage_index.get_account_usage(access_key, endpoint_url).items():
+        if name in native:
+            usage_index.publish_usage(access_key, endpoint_url, name, *native[name])
+            continue
+        if not usage_index.needs_refresh(row, max_age):
+            continue
+        try:
+            done = usage_index.scan_step(s3, access_key, endpoint_url, name, USAGE_PAGES_PER_STEP)
+            pending = pending or not done
+        except Exception as e:
+            print(f"Error processing bucket {name}: {e}")
+
+    build_snapshot(access_key, endpoint_url)
+    return pending
+
+
+def _refresh_tracked_accounts():
+    idle_since = time.monotonic() - USAGE_TRACK_IDLE
+    with _tracked_lock:
+        for key in [k for k, (_, last_seen) in _tracked_accounts.items() if last_seen < idle_since]:
+            del _tracked_accounts[key]
+        accounts = [(key, secret_key) for key, (secret_key, _) in _tracked_accounts.items()]
+
+    pending = False
+    for (endpoint_url, access_key), secret_key in accounts:
+        try:
+            pending = _refresh_account_usage(access_key, secret_key, endpoint_url) or pending
+        except Exception as e:
+            print(f"Error refreshing bucket usage for {access_key}: {e}")
+    return pending
+
+
+def track_account(access_key, secret_key, endpoint_url):
+    """Register an account with the background usage refresher, starting it on first use, and mark it as seen."""
+    global _refresh_wake
+    key = (endpoint_url or "", access_key)
+    with _tracked_lock:
+        is_new = _tracked_accounts.get(key, (None,))[0] != secret_key
+        _tracked_accounts[key] = (secret_key, time.monotonic())
+        if _refresh_wake is None:
+            _refresh_wake = start_periodic_worker("usage-refresh", USAGE_REFRESH_INTERVAL, _refresh_tracked_accounts)
+        elif is_new:
+            _refresh_wake.set()
+
+
+def untrack_account(access_key, endpoint_url):
+    """Stop refreshing an account and forget its secret, e.g. on logout."""
+    with _tracked_lock:
+        _tracked_accounts.pop((endpoint_url or "", access_key), None)
+
+
+def _rescan_usage_job(params, credentials, report, cancelled):
+    """Rescan every bucket of the account now instead of waiting for the refresh interval."""
+    started = time.time()
+    steps = 0
+    # Buckets refreshed after the job started are not scanned again
+    while not cancelled.is_set():
+        pending = _refresh_account_usage(*credentials, max_age=time.time() - started)
+        steps += 1
+        report(steps=steps)
+        if not pending:
+            break
+    return {"steps": steps}
+
+
+register_job_kind("rescan_usage", _rescan_usage_job)
+
+
+def wake_refresher():
+    """Run the usage refresher now, e.g. after a bucket was created or deleted."""
+    if _refresh_wake is not None:
+        _refresh_wake.set()
+
+
+def _bucket_stats(buckets):
+    # Scan timestamps move on every refresh; only the statistics themselves count as a change
+    return [(b["Bucket"], b["Size_Bytes"], b["Object_Count"]) for b in buckets]
+
+
+def build_snapshot(access_key, endpoint_url):
+    """Aggregate the usage index of an account into the snapshot served to dashboards."""
+    rows = usage_index.get_account_usage(access_key, endpoint_url)
+    buckets = []
+    for name, row in sorted(rows.items()):
+        size_bytes = row.get("total_size") or 0
+        buckets.append({
+            "Bucket": name,
+            "Size_Bytes": size_bytes,
+            "Size_GB": round(size_bytes / (1024 ** 3), 2),
+            "Object_Count": row.get("total_objects") or 0,
+            "Last_Refreshed": row.get("last_refreshed")
+        })
+
+    snapshot = {
+        "generated_at": time.time(),
+        "buckets": buckets,
+        "bucket_count": len(buckets),
+        "total_size_bytes": sum(b["Size_Bytes"] for b in buckets),
+        "version": 1
+    }
+    key = (endpoint_url or "", access_key)
+    with _snapshots_changed:
+        previous = _snapshots.get(key)
+        if previous is not None:
+            changed = _bucket_stats(previous["buckets"]) != _bucket_stats(buckets)
+            snapshot["version"] = previous["version"] + (1 if changed else 0)
+        else:
+            changed = True
+        _snapshots[key] = snapshot
+        if changed:
+            _snapshots_changed.notify_all()
+    return snapshot
+
+
+def get_dashboard_snapshot(access_key=None, secret_key=None, endpoint_url=None):
+    """
+    Return the latest dashboard snapshot of an account.
+
+    Snapshots are rebuilt by the usage refresher after each pass, so serving
+    them costs no S3 calls. The first request of an account seeds the usage
+    index with a single list_buckets call if it is still empty.
+    """
+    access_key, secret_key, endpoint_url = _resolve_credentials(access_key, secret_key, endpoint_url)
+    track_account(access_key, secret_key, endpoint_url)
+
+    with _snapshots_changed:
+        snapshot = _snapshots.get((endpoint_url or "", access_key))
+    if snapshot is not None:
+        return snapshot
+
+    if not usage_index.get_account_usage(access_key, endpoint_url):
+        s3 = get_s3_client(access_key, secret_key, endpoint_url)
+        bucket_names = [b["Name"] for b in s3.list_buckets().get("Buckets", [])]
+        usage_index.sync_buckets(access_key, endpoint_url, bucket_names)
+    return build_snapshot(access_key, endpoint_url)
+
+
+def snapshot_age(snapshot):
+    return round(time.time() - snapshot["generated_at"], 1)
+
+
+def wait_for_snapshot(access_key, endpoint_url, version, timeout):
+    """
+    Block until the account's snapshot is newer than `version` and return it,
+    or return None after `timeout` seconds without a change.
+    """
+    key = (endpoint_url or "", access_key)
+    with _snapshots_changed:
+        _snapshots_changed.wait_for(
+            lambda: key in _snapshots and _snapshots[key]["version"] > version,
+            timeout
+        )
+        snapshot = _snapshots.get(key)
+    if snapshot is not None and snapshot["version"] > version:
+        return snapshot
+    return None
+
+
+def snapshot_delta(old, new):
+    """Buckets added or changed and bucket names removed between two snapshots."""
+    old_buckets = {b["Bucket"]: b for b in old["buckets"]}
+    new_names = {b["Bucket"] for b in new["buckets"]}
+    return {
+        "changed": [b for b in new["buckets"] if old_buckets.get(b["Bucket"]) != b],
+        "removed": [name for name in old_buckets if name not in new_names]
+    }
+
+
+def get_bucket_usage(bucket_name, access_key=None, secret_key=None, endpoint_url=None):
+    """
+    Return the indexed usage of a bucket as a dict with size, objects and last_refreshed.
+
+    Reads come from the usage index only; buckets that have not been scanned yet
+    report zero with last_refreshed set to None.
+    """
+    access_key, secret_key, endpoint_url = _resolve_credentials(access_key, secret_key, endpoint_url)
+    track_account(access_key, secret_key, endpoint_url)
+
+    row = usage_index.get_bucket_usage(bucket_name, access_key, endpoint_url) or {}
+    return {
+        "size": row.get("total_size") or 0,
+        "objects": row.get("total_objects") or 0,
+        "last_refreshed": row.get("last_refreshed")
+    }
+
+
+def get_bucket_size_and_count(bucket_name, access_key=None, secret_key=None, endpoint_url=None):
+    usage = get_bucket_usage(bucket_name, access_key, secret_key, endpoint_url)
+    return usage["size"], usage["objects"]
+
+def filter_bucket_data(buckets, search_filter=""):
+    """Buckets matching the search, or the five largest when there is no search."""
+    if search_filter:
+        return [b for b in buckets if search_filter.lower() in b["Bucket"].lower()]
+    return sorted(buckets, key=lambda x: x["Size_Bytes"], reverse=True)[:5]
+
 
 def get_bucket_data(search_filter=""):
     try:
-        s3 = get_s3_client()
-        all_buckets = s3.list_buckets().get("Buckets", [])
-        bucket_data = []
-        
-        for bucket in all_buckets:
-            name = bucket["Name"]
-            
-            if search_filter and search_filter.lower() not in name.lower():
-                continue
-                
-            size_bytes, object_count = get_bucket_size_and_count(name)
-            size_gb = size_bytes / (1024 ** 3)
-            
-            bucket_data.append({
-                "Bucket": name, 
-                "Size_Bytes": size_bytes, 
-                "Size_GB": round(size_gb, 2),
-                "Object_Count": object_count
-            })
-        
-        if not search_filter:
-            bucket_data.sort(key=lambda x: x["Size_Bytes"], reverse=True)
-            bucket_data = bucket_data[:5]
-            
-        return bucket_data
-        
+        return filter_bucket_data(get_dashboard_snapshot()["buckets"], search_filter)
     except Exception as e:
         print(f"Error in get_bucket_data: {e}")
         return []
 
 def get_all_buckets_stats():
     try:
-        s3 = get_s3_client()
-        all_buckets = s3.list_buckets().get("Buckets", [])
-        bucket_data = []
-        
-        for bucket in all_buckets:
-            name = bucket["Name"]
-            size_bytes, object_count = get_bucket_size_and_count(name)
-            size_gb = size_bytes / (1024 ** 3)
-            
-            bucket_data.append({
-                "Bucket": name, 
-                "Size_Bytes": size_bytes, 
-                "Size_GB": round(size_gb, 2),
-                "Object_Count": object_count
-            })
-            
-        return bucket_data
-        
+        return list(get_dashboard_snapshot()["buckets"])
     except Exception as e:
         print(f"Error in get_all_buckets_stats: {e}")
         return []
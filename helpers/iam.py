@@ -0,0 +1,221 @@
+# helpers/iam.py
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from cachetools import TTLCache
+from botocore.exceptions import ClientError, NoCredentialsError
+from helpers.clients import get_client
+
+IAM_ENRICH_WORKERS = int(os.getenv("IAM_ENRICH_WORKERS", "16"))
+IAM_CACHE_TTL = int(os.getenv("IAM_CACHE_TTL", "60"))
+IAM_PAGE_SIZE = int(os.getenv("IAM_PAGE_SIZE", "1000"))
+
+# (endpoint_url, access_key, kind) -> cached IAM listing
+_iam_cache = TTLCache(maxsize=512, ttl=IAM_CACHE_TTL)
+_iam_cache_lock = threading.Lock()
+
+# (endpoint_url, access_key) whose backend does not implement GetAccountAuthorizationDetails,
+# so it is not retried on every load; entries expire in case the backend is upgraded
+_no_authorization_details = TTLCache(maxsize=512, ttl=3600)
+# Error codes meaning the operation is unsupported, not that this one call failed
+_UNSUPPORTED_CODES = ("NotImplemented", "MethodNotAllowed", "InvalidAction", "UnsupportedOperation")
+
+
+def _iam_client(access_key, secret_key, endpoint_url):
+    return get_client(
+        "iam",
+        aws_access_key_id=access_key,
+        aws_secret_access_key=secret_key,
+        endpoint_url=endpoint_url,
+        region_name="us-east-1"
+    )
+
+
+def _cached(access_key, endpoint_url, kind, loader, refresh=False):
+    key = (endpoint_url or "", access_key, kind)
+    if not refresh:
+        with _iam_cache_lock:
+            value = _iam_cache.get(key)
+        if value is not None:
+            return value
+
+    value = loader()
+    with _iam_cache_lock:
+        _iam_cache[key] = value
+    return value
+
+
+def invalidate_iam_cache(access_key, endpoint_url, *kinds):
+    """Drop cached IAM listings of an account; all of them unless kinds are given."""
+    endpoint_url = endpoint_url or ""
+    with _iam_cache_lock:
+        for key in list(_iam_cache.keys()):
+            if key[0] == endpoint_url and key[1] == access_key and (not kinds or key[2] in kinds):
+                _iam_cache.pop(key, None)
+
+
+def _list_all(iam, operation, result_key):
+    paginator = iam.get_paginator(operation)
+    items = []
+    for page in paginator.paginate(PaginationConfig={"PageSize": IAM_PAGE_SIZE}):
+        items.extend(page.get(result_key, []))
+    return items
+
+
+def list_users(access_key, secret_key, endpoint_url, refresh=False):
+    """Every IAM user of the account (all pages), cached for IAM_CACHE_TTL seconds."""
+    return _cached(
+        access_key, endpoint_url, "users",
+        lambda: _list_all(_iam_client(access_key, secret_key, endpoint_url), "list_users", "Users"),
+        refresh
+    )
+
+
+def list_groups(access_key, secret_key, endpoint_url, refresh=False):
+    """Every IAM group of the account (all pages), cached for IAM_CACHE_TTL seconds."""
+    return _cached(
+        access_key, endpoint_url, "groups",
+        lambda: _list_all(_iam_client(access_key, secret_key, endpoint_url), "list_groups", "Groups"),
+        refresh
+    )
+
+
+def _users_from_authorization_details(iam):
+    """Users with their groups from GetAccountAuthorizationDetails, a few paginated calls in total."""
+    users = []
+    paginator = iam.get_paginator("get_account_authorization_details")
+    for page in paginator.paginate(Filter=["User"], PaginationConfig={"PageSize": IAM_PAGE_SIZE}):
+        for u in page.get("UserDetailList", []):
+            users.append({
+                "UserName": u.get("UserName"),
+                "Arn": u.get("Arn"),
+                "Created": str(u.get("CreateDate")),
+                "Groups": list(u.get("GroupList", []))
+            })
+    return users
+
+
+def _groups_for_user(iam, username):
+    try:
+        paginator = iam.get_paginator("list_groups_for_user")
+        return [g["GroupName"] for page in paginator.paginate(UserName=username) for g in page.get("Groups", [])]
+    except ClientError:
+        return []
+
+
+def _users_with_group_calls(iam, executor, all_users):
+    """Fallback for backends without GetAccountAuthorizationDetails: one group call per user, in parallel."""
+    users = [{
+        "UserName": u.get("UserName"),
+        "Arn": u.get("Arn"),
+        "Created": str(u.get("CreateDate"))
+    } for u in all_users]
+
+    groups = executor.map(lambda u: _groups_for_user(iam, u["UserName"]), users)
+    for user, user_groups in zip(users, groups):
+        user["Groups"] = user_groups
+    return users
+
+
+def _active_key_count(iam, username):
+    """Return (active key count, error message)."""
+    try:
+        keys = iam.list_access_keys(UserName=username).get("AccessKeyMetadata", [])
+        return sum(1 for k in keys if k.get("Status") == "Active"), None
+    except ClientError as e:
+        return None, e.response["Error"].get("Message", str(e))
+    except Exception as e:
+        return None, str(e)
+
+
+def _load_enriched_users(access_key, secret_key, endpoint_url, refresh=False):
+    iam = _iam_client(access_key, secret_key, endpoint_url)
+    with ThreadPoolExecutor(max_workers=IAM_ENRICH_WORKERS) as executor:
+        users = None
+        account = (endpoint_url or "", access_key)
+        if account not in _no_authorization_details:
+            try:
+                users = _users_from_authorization_details(iam)
+            except NoCredentialsError:
+                raise
+            except Exception as e:
+                # Unsupported on some backends (e.g. Ceph RGW); fall back to per-user calls.
+                # Throttling, timeouts and the like only skip it for this load.
+                print(f"GetAccountAuthorizationDetails unavailable, listing users one by one: {e}")
+                if isinstance(e, ClientError) and e.response.get("Error", {}).get("Code") in _UNSUPPORTED_CODES:
+                    _no_authorization_details[account] = True
+        if users is None:
+            users = _users_with_group_calls(iam, executor, list_users(access_key, secret_key, endpoint_url, refresh))
+
+        key_counts = executor.map(lambda u: _active_key_count(iam, u["UserName"]), users)
+        for user, (count, error) in zip(users, key_counts):
+            user["ActiveKeysCount"] = count
+            user["ActiveKeysError"] = error
+    return users
+
+
+def get_enriched_users(access_key, secret_key, endpoint_url, refresh=False):
+    """
+    All IAM users with their groups and active access key count.
+
+    Users and groups come from GetAccountAuthorizationDetails when the backend
+    supports it, otherwise from list_users plus one list_groups_for_user per
+    user. Access keys are counted with one call per user. Per-user calls run on
+    a pool of IAM_ENRICH_WORKERS threads and the result is cached for
+    IAM_CACHE_TTL seconds.
+    """
+    try:
+        return _cached(
+            access_key, endpoint_url, "enriched_users",
+            lambda: _load_enriched_users(access_key, secret_key, endpoint_url, refresh),
+            refresh
+        )
+    except NoCredentialsError:
+        return [{"Error": "Credentials not found or invalid."}]
+    except ClientError as e:
+        return [{"Error": f"AWS client error: {str(e)}"}]
+
+
+def _group_members(iam, group_name):
+    """Return (member user names, error message) for one group."""
+    try:
+        paginator = iam.get_paginator("get_group")
+        members = [u["UserName"] for page in paginator.paginate(GroupName=group_name) for u in page.get("Users", [])]
+        return members, None
+    except ClientError as e:
+        return [], e.response["Error"].get("Message", str(e))
+    except Exception as e:
+        return [], str(e)
+
+
+def _load_group_membership(access_key, secret_key, endpoint_url, refresh=False):
+    iam = _iam_client(access_key, secret_key, endpoint_url)
+    groups = list_groups(access_key, secret_key, endpoint_url, refresh)
+
+    with ThreadPoolExecutor(max_workers=IAM_ENRICH_WORKERS) as executor:
+        results = list(executor.map(lambda g: _group_members(iam, g["GroupName"]), groups))
+
+    members = {}
+    errors = {}
+    for group, (group_members, error) in zip(groups, results):
+        members[group["GroupName"]] = group_members
+        if error:
+            errors[group["GroupName"]] = error
+    return {"groups": groups, "members": members, "errors": errors}
+
+
+def get_group_membership(access_key, secret_key, endpoint_url, refresh=False):
+    """
+    Group membership index: {"groups": [...], "members": {group: [users]}, "errors": {group: message}}.
+
+    Built with one get_group call per group on a bounded pool instead of
+    checking every user against every group. Cached for IAM_CACHE_TTL seconds;
+    membership changes made through the panel invalidate it. refresh=True also
+    re-lists the groups instead of reusing the cached group list.
+    """
+    return _cached(
+        access_key, endpoint_url, "group_membership",
+        lambda: _load_group_membership(access_key, secret_key, endpoint_url, refresh),
+        refresh
+    )
+
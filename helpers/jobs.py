@@ -0,0 +1,224 @@
+# helpers/jobs.py
+import os
+import json
+import time
+import uuid
+import hashlib
+import sqlite3
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+JOBS_DB_FILE = "database/jobs.db"
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_PROGRESS_INTERVAL = float(os.getenv("JOB_PROGRESS_INTERVAL", "1"))
+JOB_RETENTION_DAYS = int(os.getenv("JOB_RETENTION_DAYS", "7"))
+
+ACTIVE_STATES = ("queued", "running")
+
+# kind -> handler(params, credentials, report, cancelled) returning a JSON-serializable result
+_handlers = {}
+
+# job_id -> cancel Event of jobs queued or running in this process.
+# Credentials are only held by the running task, never written to the job table.
+_active = {}
+_active_lock = threading.Lock()
+_executor = None
+
+
+def _connect():
+    conn = sqlite3.connect(JOBS_DB_FILE, timeout=30)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def _now():
+    return datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds")
+
+
+# --- Database init ---
+def init_jobs_db():
+    conn = _connect()
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            endpoint_url TEXT NOT NULL,
+            access_key TEXT NOT NULL,
+            dedup_key TEXT NOT NULL,
+            params TEXT,
+            state TEXT NOT NULL,
+            progress TEXT,
+            result TEXT,
+            error TEXT,
+            created_at TEXT,
+            started_at TEXT,
+            finished_at TEXT
+        )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS jobs_dedup ON jobs (dedup_key, state)")
+    cur.execute("CREATE INDEX IF NOT EXISTS jobs_account ON jobs (endpoint_url, access_key, created_at)")
+
+    # Jobs cannot survive a restart: their credentials lived in memory only
+    cur.execute("""
+        UPDATE jobs SET state = 'failed', error = 'Interrupted by a restart', finished_at = ?
+        WHERE state IN ('queued', 'running')
+    """, (_now(),))
+    cutoff = (datetime.datetime.now(datetime.timezone.utc)
+              - datetime.timedelta(days=JOB_RETENTION_DAYS)).isoformat(timespec="seconds")
+    cur.execute("DELETE FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?", (cutoff,))
+    conn.commit()
+    conn.close()
+
+
+def register_job_kind(kind, handler):
+    """
+    Register the handler of a job kind.
+
+    The handler is called as handler(params, credentials, report, cancelled):
+    credentials is (access_key, secret_key, endpoint_url), report(**fields)
+    publishes progress, and cancelled is an Event the handler should check
+    between units of work. Its return value is stored as the job result.
+    """
+    _handlers[kind] = handler
+
+
+def _dedup_key(kind, access_key, endpoint_url, params):
+    material = json.dumps([kind, endpoint_url or "", access_key, params], sort_keys=True)
+    return hashlib.sha256(material.encode()).hexdigest()
+
+
+def _update(job_id, **fields):
+    columns = ", ".join(f"{name} = ?" for name in fields)
+    conn = _connect()
+    conn.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+    conn.commit()
+    conn.close()
+
+
+def _progress_reporter(job_id):
+    """report(**fields) merging fields into the job progress, written at most every JOB_PROGRESS_INTERVAL."""
+    progress = {}
+    last_write = [0.0]
+
+    def report(**fields):
+        progress.update(fields)
+        now = time.monotonic()
+        if now - last_write[0] >= JOB_PROGRESS_INTERVAL:
+            last_write[0] = now
+            _update(job_id, progress=json.dumps(progress))
+
+    return report, progress
+
+
+def _run(job_id, kind, params, credentials, cancelled):
+    try:
+        if cancelled.is_set():
+            _update(job_id, state="cancelled", finished_at=_now())
+            return
+
+        _update(job_id, state="running", started_at=_now())
+        report, progress = _progress_reporter(job_id)
+        try:
+            result = _handlers[kind](params, credentials, report, cancelled)
+            _update(
+                job_id,
+                state="cancelled" if cancelled.is_set() else "done",
+                progress=json.dumps(progress),
+                result=json.dumps(result),
+                finished_at=_now()
+            )
+        except Exception as e:
+            print(f"Job {job_id} ({kind}) failed: {e}")
+            _update(job_id, state="failed", progress=json.dumps(progress), error=str(e), finished_at=_now())
+    finally:
+        with _active_lock:
+            _active.pop(job_id, None)
+
+
+def submit_job(kind, params, access_key, secret_key, endpoint_url):
+    """
+    Queue a job and return its id.
+
+    If a job of the same kind with the same parameters is already queued or
+    running for the account, its id is returned instead of starting another.
+    """
+    global _executor
+    if kind not in _handlers:
+        raise ValueError(f"Unknown job kind: {kind}")
+
+    endpoint_url = endpoint_url or ""
+    dedup_key = _dedup_key(kind, access_key, endpoint_url, params)
+    with _active_lock:
+        conn = _connect()
+        row = conn.execute(
+            "SELECT id FROM jobs WHERE dedup_key = ? AND state IN ('queued', 'running')",
+            (dedup_key,)
+        ).fetchone()
+        if row and row["id"] in _active:
+            conn.close()
+            return row["id"]
+
+        job_id = uuid.uuid4().hex
+        conn.execute("""
+            INSERT INTO jobs (id, kind, endpoint_url, access_key, dedup_key, params, state, progress, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, 'queued', '{}', ?)
+        """, (job_id, kind, endpoint_url, access_key, dedup_key, json.dumps(params), _now()))
+        conn.commit()
+        conn.close()
+
+        cancelled = threading.Event()
+        _active[job_id] = cancelled
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="job")
+    _executor.submit(_run, job_id, kind, params, (access_key, secret_key, endpoint_url), cancelled)
+    return job_id
+
+
+def _job_dict(row):
+    job = dict(row)
+    for field in ("params", "progress", "result"):
+        job[field] = json.loads(job[field]) if job[field] else None
+    for field in ("endpoint_url", "access_key", "dedup_key"):
+        job.pop(field)
+    return job
+
+
+def get_job(job_id, access_key, endpoint_url):
+    """Return a job of the account as a dict, or None."""
+    conn = _connect()
+    row = conn.execute(
+        "SELECT * FROM jobs WHERE id = ? AND endpoint_url = ? AND access_key = ?",
+        (job_id, endpoint_url or "", access_key)
+    ).fetchone()
+    conn.close()
+    return _job_dict(row) if row else None
+
+
+def list_jobs(access_key, endpoint_url, limit=50):
+    """Most recent jobs of the account, newest first."""
+    conn = _connect()
+    rows = conn.execute("""
+        SELECT * FROM jobs WHERE endpoint_url = ? AND access_key = ?
+        ORDER BY created_at DESC LIMIT ?
+    """, (endpoint_url or "", access_key, limit)).fetchall()
+    conn.close()
+    return [_job_dict(r) for r in rows]
+
+
+def cancel_job(job_id, access_key, endpoint_url):
+    """Ask a queued or running job to stop. Returns False if it is unknown or already finished."""
+    job = get_job(job_id, access_key, endpoint_url)
+    if job is None or job["state"] not in ACTIVE_STATES:
+        return False
+    with _active_lock:
+        cancelled = _active.get(job_id)
+    if cancelled is None:
+        return False
+    cancelled.set()
+    return True
+
+
+# --- Initialize DB on import ---
+init_jobs_db()
@@ -0,0 +1,200 @@
+# helpers/listing.py
+import os
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+LISTING_MAX_WORKERS = int(os.getenv("LISTING_MAX_WORKERS", "16"))
+LISTING_MAX_SHARDS = int(os.getenv("LISTING_MAX_SHARDS", "64"))
+LISTING_PROBE_PAGES = int(os.getenv("LISTING_PROBE_PAGES", "5"))
+
+# Sorts after any other character, so base + _MAX_CHAR skips every key starting with base
+_MAX_CHAR = "\U0010ffff"
+_MAX_SPLIT_DEPTH = 64
+_DONE = object()
+
+
+def _common_prefixes(s3, bucket, prefix):
+    response = s3.list_objects_v2(Bucket=bucket, Prefix=prefix, Delimiter="/")
+    return [p["Prefix"] for p in response.get("CommonPrefixes", [])]
+
+
+def _child_prefixes(s3, bucket, base, limit):
+    """Distinct one-character extensions of base among existing keys, one MaxKeys=1 request each."""
+    children = []
+    after = base
+    while len(children) < limit:
+        response = s3.list_objects_v2(Bucket=bucket, Prefix=base, StartAfter=after, MaxKeys=1)
+        contents = response.get("Contents", [])
+        if not contents:
+            break
+        child = contents[0]["Key"][:len(base) + 1]
+        children.append(child)
+        after = child + _MAX_CHAR
+    return children
+
+
+def _split_keyspace(s3, bucket, base, target):
+    """
+    Split points for keys under base without folder structure.
+
+    Walks the keyspace breadth-first, replacing a point by the key prefixes
+    one character longer that actually exist, until there are `target`
+    points. Sequential keys such as "k000000".."k999999" thus split on the
+    digits that vary rather than on the shared leading characters.
+    """
+    points = [base]
+    frontier = deque([base])
+    while frontier and len(points) < target:
+        node = frontier.popleft()
+        if len(node) - len(base) >= _MAX_SPLIT_DEPTH:
+            continue
+        children = _child_prefixes(s3, bucket, node, target)
+        if not children:
+            continue
+        points.remove(node)
+        points.extend(children)
+        frontier.extend(children)
+    return sorted(points)
+
+
+def plan_shards(s3, bucket, prefix="", max_shards=None):
+    """
+    Split the keyspace under a prefix into key ranges that can be listed independently.
+
+    Split points are the folders found with Delimiter="/", one level deeper
+    when there are only a few, or existing key prefixes (see _split_keyspace)
+    when the keyspace has no folders. Returns a list of (after, upto) ranges
+    covering keys k with after < k <= upto; None means unbounded.
+    """
+    max_shards = max_shards or LISTING_MAX_SHARDS
+    points = _common_prefixes(s3, bucket, prefix)
+
+    # A handful of huge folders would give a handful of shards; split them too
+    if 0 < len(points) < max_shards // 4:
+        deeper = []
+        for point in points:
+            deeper.extend(_common_prefixes(s3, bucket, point))
+        points = sorted(set(points + deeper))
+
+    if len(points) < 2:
+        # The walk descends into a lone folder by itself and also covers keys beside it
+        points = _split_keyspace(s3, bucket, prefix, max_shards)
+
+    if len(points) > max_shards - 1:
+        step = len(points) / (max_shards - 1)
+        points = [points[int(i * step)] for i in range(max_shards - 1)]
+
+    bounds = [None] + points + [None]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def list_shard_pages(s3, bucket, prefix, shard, start_after=None):
+    """
+    Yield (objects, more) for each listing page of one shard, in key order.
+    `more` is False on the last page. start_after resumes a shard from a checkpoint.
+    """
+    after, upto = shard
+    params = {"Bucket": bucket, "Prefix": prefix}
+    start = start_after or after
+    if start:
+        params["StartAfter"] = start
+
+    while True:
+        response = s3.list_objects_v2(**params)
+        contents = response.get("Contents", [])
+        if upto is not None and contents and contents[-1]["Key"] > upto:
+            yield [obj for obj in contents if obj["Key"] <= upto], False
+            return
+        more = bool(response.get("IsTruncated"))
+        yield contents, more
+        if not more:
+            return
+        params["ContinuationToken"] = response["NextContinuationToken"]
+
+
+def _list_shard(s3, bucket, prefix, shard, out, cancelled):
+    try:
+        for objects, _ in list_shard_pages(s3, bucket, prefix, shard):
+            if cancelled.is_set():
+                return
+            if objects:
+                _put(out, objects, cancelled)
+    except Exception as e:
+        _put(out, e, cancelled)
+    finally:
+        _put(out, _DONE, cancelled)
+
+
+def _put(out, item, cancelled):
+    # Bounded queue: wait for the consumer, but give up once it has gone away
+    while not cancelled.is_set():
+        try:
+            out.put(item, timeout=0.5)
+            return
+        except queue.Full:
+            continue
+
+
+def iter_pages(s3, bucket, prefix="", max_workers=None, max_shards=None):
+    """
+    Yield pages (lists of object dicts) of every object under a prefix.
+
+    The first LISTING_PROBE_PAGES pages are listed serially, so small
+    listings cost no discovery requests. The rest is split with plan_shards
+    and the shards are listed concurrently on a pool of max_workers threads,
+    so the walk scales with concurrency instead of key count. Pages arrive
+    as soon as they are listed, in no particular order across shards; at
+    most twice max_workers pages are buffered. Closing the generator stops
+    the remaining shards.
+    """
+    max_workers = max_workers or LISTING_MAX_WORKERS
+    # Most listings are small: walk the first pages serially before paying for shard discovery
+    last_key = None
+    pages = list_shard_pages(s3, bucket, prefix, (None, None))
+    for page_number, (contents, more) in enumerate(pages, start=1):
+        if contents:
+            last_key = contents[-1]["Key"]
+            yield contents
+        if not more:
+            return
+        if page_number >= LISTING_PROBE_PAGES:
+            break
+    pages.close()
+
+    # Shards resume after the keys already listed
+    shards = []
+    for after, upto in plan_shards(s3, bucket, prefix, max_shards):
+        if last_key is not None:
+            if upto is not None and upto <= last_key:
+                continue
+            if after is None or after < last_key:
+                after = last_key
+        shards.append((after, upto))
+
+    out = queue.Queue(maxsize=max_workers * 2)
+    cancelled = threading.Event()
+    executor = ThreadPoolExecutor(max_workers=min(max_workers, len(shards)))
+    try:
+        for shard in shards:
+            executor.submit(_list_shard, s3, bucket, prefix, shard, out, cancelled)
+
+        remaining = len(shards)
+        while remaining:
+            item = out.get()
+            if item is _DONE:
+                remaining -= 1
+            elif isinstance(item, Exception):
+                raise item
+            else:
+                yield item
+    finally:
+        cancelled.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def iter_objects(s3, bucket, prefix="", max_workers=None, max_shards=None):
+    """Every object under a prefix, listed with iter_pages; order is not guaranteed."""
+    for page in iter_pages(s3, bucket, prefix, max_workers, max_shards):
+        yield from page
@@ -0,0 +1,279 @@
+# helpers/s3_select.py
+import os
+import re
+import codecs
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+SELECT_SCAN_RANGE_SIZE = int(os.getenv("SELECT_SCAN_RANGE_SIZE", str(64 * 1024 * 1024)))
+SELECT_MAX_PARALLEL = int(os.getenv("SELECT_MAX_PARALLEL", "8"))
+SELECT_PREFIX_MAX_KEYS = int(os.getenv("SELECT_PREFIX_MAX_KEYS", "10000"))
+
+INPUT_FORMATS = ("CSV", "JSON_LINES", "JSON_DOCUMENT", "PARQUET")
+COMPRESSION_TYPES = ("NONE", "GZIP", "BZIP2")
+CSV_HEADER_MODES = ("USE", "IGNORE", "NONE")
+
+# Events (record chunks, progress) buffered per job waiting for its turn to be relayed
+SELECT_BUFFERED_EVENTS = 64
+
+# Aggregates and LIMIT give one answer per range, which cannot simply be concatenated
+_NOT_SPLITTABLE = re.compile(r"\b(COUNT|SUM|AVG|MIN|MAX|LIMIT)\b", re.IGNORECASE)
+
+
+def build_input_serialization(input_format="CSV", compression="NONE", delimiter=",", header="USE"):
+    """Build the InputSerialization block; raises ValueError on unsupported combinations."""
+    input_format = (input_format or "CSV").upper()
+    compression = (compression or "NONE").upper()
+    header = (header or "USE").upper()
+
+    if input_format not in INPUT_FORMATS:
+        raise ValueError(f"Unsupported input format: {input_format}")
+    if compression not in COMPRESSION_TYPES:
+        raise ValueError(f"Unsupported compression: {compression}")
+
+    if input_format == "PARQUET":
+        if compression != "NONE":
+            raise ValueError("Parquet objects are compressed internally; use compression NONE")
+        return {"Parquet": {}, "CompressionType": "NONE"}
+
+    if input_format in ("JSON_LINES", "JSON_DOCUMENT"):
+        json_type = "LINES" if input_format == "JSON_LINES" else "DOCUMENT"
+        return {"JSON": {"Type": json_type}, "CompressionType": compression}
+
+    if header not in CSV_HEADER_MODES:
+        raise ValueError(f"Unsupported CSV header mode: {header}")
+    return {
+        "CSV": {
+            "FileHeaderInfo": header,
+            "RecordDelimiter": "\n",
+            "FieldDelimiter": delimiter
+        },
+        "CompressionType": compression
+    }
+
+
+def build_output_serialization(delimiter=","):
+    """Results are always returned as CSV so the page can render them as a table."""
+    return {"CSV": {"RecordDelimiter": "\n", "FieldDelimiter": delimiter}}
+
+
+def can_split(input_serialization, expression):
+    """
+    True if the query may be split into scan ranges whose results are concatenated.
+
+    Only uncompressed JSON Lines and header-less CSV qualify: a header row only
+    exists in the first range, and aggregates/LIMIT would be applied per range.
+    """
+    if input_serialization.get("CompressionType") != "NONE":
+        return False
+    if _NOT_SPLITTABLE.search(expression or ""):
+        return False
+    if "JSON" in input_serialization:
+        return input_serialization["JSON"]["Type"] == "LINES"
+    if "CSV" in input_serialization:
+        return input_serialization["CSV"]["FileHeaderInfo"] == "NONE"
+    return False
+
+
+def scan_ranges(size, range_size=None):
+    """Split an object of `size` bytes into (start, end) scan ranges; End is inclusive, as in ScanRange."""
+    range_size = range_size or SELECT_SCAN_RANGE_SIZE
+    return [(start, min(start + range_size, size) - 1) for start in range(0, size, range_size)]
+
+
+def start_select(s3, bucket, key, expression, input_serialization, output_serialization, scan_range=None):
+    """Start a Select request and return its event stream."""
+    params = {
+        "Bucket": bucket,
+        "Key": key,
+        "Expression": expression,
+        "ExpressionType": "SQL",
+        "InputSerialization": input_serialization,
+        "OutputSerialization": output_serialization,
+        "RequestProgress": {"Enabled": True}
+    }
+    if scan_range:
+        params["ScanRange"] = {"Start": scan_range[0], "End": scan_range[1]}
+    return s3.select_object_content(**params)["Payload"]
+
+
+def _byte_counts(details):
+    return {
+        "scanned": details.get("BytesScanned", 0),
+        "processed": details.get("BytesProcessed", 0),
+        "returned": details.get("BytesReturned", 0)
+    }
+
+
+def select_events(payload):
+    """
+    Translate a Select event stream into event dicts as events arrive.
+
+    Yields "records" (decoded CSV text), "progress" and "stats" (byte counts),
+    "end", or "error" if the stream fails midway. Nothing is accumulated.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    try:
+        for event in payload:
+            if "Records" in event:
+                text = decoder.decode(event["Records"]["Payload"])
+                if text:
+                    yield {"type": "records", "data": text}
+            elif "Progress" in event:
+                yield {"type": "progress", **_byte_counts(event["Progress"]["Details"])}
+            elif "Stats" in event:
+                yield {"type": "stats", **_byte_counts(event["Stats"]["Details"])}
+            elif "End" in event:
+                tail = decoder.decode(b"", final=True)
+                if tail:
+                    yield {"type": "records", "data": tail}
+                yield {"type": "end"}
+    except Exception as e:
+        yield {"type": "error", "message": str(e)}
+    finally:
+        payload.close()
+
+
+def _put(out, item, cancelled):
+    # Bounded queue: wait for the consumer, but give up once it has gone away
+    while not cancelled.is_set():
+        try:
+            out.put(item, timeout=0.5)
+            return
+        except queue.Full:
+            continue
+
+
+def _run_job(job, out, cancelled):
+    try:
+        events = job()
+        try:
+            for event in events:
+                if cancelled.is_set():
+                    break
+                _put(out, event, cancelled)
+        finally:
+            if hasattr(events, "close"):
+                events.close()
+    except Exception as e:
+        _put(out, {"type": "error", "message": str(e)}, cancelled)
+    finally:
+        _put(out, None, cancelled)
+
+
+def _sum_counts(counts):
+    return {
+        field: sum(c.get(field, 0) for c in counts.values())
+        for field in ("scanned", "processed", "returned")
+    }
+
+
+def run_parallel(jobs, max_workers=None, stop_on_error=True):
+    """
+    Run Select jobs concurrently and yield their events in job order.
+
+    Each job is a zero-argument callable returning an iterable of event dicts
+    (see select_events). Records of the job being relayed are streamed as they
+    arrive; later jobs buffer at most SELECT_BUFFERED_EVENTS events each and
+    then wait for their turn, and at most twice max_workers jobs are started
+    ahead, so memory stays bounded. Progress and stats are summed over all
+    jobs, and a single "end" is emitted when every job is done. Closing the
+    generator cancels the remaining jobs.
+    """
+    max_workers = max(1, min(max_workers or SELECT_MAX_PARALLEL, len(jobs) or 1))
+    window = max_workers * 2
+    cancelled = threading.Event()
+    outputs = [queue.Queue(maxsize=SELECT_BUFFERED_EVENTS) for _ in jobs]
+    progress, stats = {}, {}
+
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        for job, out in list(zip(jobs, outputs))[:window]:
+            executor.submit(_run_job, job, out, cancelled)
+
+        for index, out in enumerate(outputs):
+            if index + window < len(jobs):
+                executor.submit(_run_job, jobs[index + window], outputs[index + window], cancelled)
+            while True:
+                event = out.get()
+                if event is None:
+                    break
+                event_type = event["type"]
+                if event_type == "progress":
+                    progress[index] = event
+                    yield {"type": "progress", **_sum_counts(progress)}
+                elif event_type == "stats":
+                    stats[index] = event
+                    progress[index] = event
+                elif event_type == "error":
+                    yield event
+                    if stop_on_error:
+                        return
+                elif event_type != "end":
+                    yield event
+
+        if stats:
+            yield {"type": "stats", **_sum_counts(stats)}
+        yield {"type": "end"}
+    finally:
+        cancelled.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def list_prefix_keys(s3, bucket, prefix, max_keys=None):
+    """
+    List object keys under a prefix for a multi-object query, skipping folder markers.
+    Returns (keys, truncated); truncated is True when more than max_keys objects matched.
+    """
+    max_keys = max_keys or SELECT_PREFIX_MAX_KEYS
+    keys = []
+    paginator = s3.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix or ""):
+        for obj in page.get("Contents", []):
+            if obj["Key"].endswith("/") or not obj.get("Size"):
+                continue
+            # One key past the limit tells a prefix of exactly max_keys objects from a larger one
+            if len(keys) >= max_keys:
+                return keys, True
+            keys.append(obj["Key"])
+    return keys, False
+
+
+def _key_events(s3, bucket, key, expression, input_serialization, output_serialization):
+    try:
+        payload = start_select(s3, bucket, key, expression, input_serialization, output_serialization)
+    except Exception as e:
+        yield {"type": "error", "key": key, "message": str(e)}
+        return
+    for event in select_events(payload):
+        if event["type"] == "error":
+            event = {**event, "key": key}
+        yield event
+
+
+def query_prefix(s3, bucket, keys, expression, input_serialization, output_serialization, max_workers=None,
+                 truncated=False):
+    """
+    Run the same query over many objects on a bounded worker pool.
+
+    Rows are streamed in key order. A failing key does not stop the others:
+    its error is reported as an "error" event carrying the key, and a final
+    "summary" event lists every failed key before "end". When the key list
+    was cut at SELECT_PREFIX_MAX_KEYS (truncated), the summary says so.
+    """
+    jobs = [
+        lambda key=key: _key_events(s3, bucket, key, expression, input_serialization, output_serialization)
+        for key in keys
+    ]
+    failed = []
+    events = run_parallel(jobs, max_workers, stop_on_error=False)
+    try:
+        for event in events:
+            if event["type"] == "error":
+                failed.append({"key": event.get("key"), "message": event["message"]})
+            elif event["type"] == "end":
+                yield {"type": "summary", "keys": len(keys), "failed": failed, "truncated": truncated}
+            yield event
+    finally:
+        events.close()
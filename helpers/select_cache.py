@@ -0,0 +1,138 @@
+# helpers/select_cache.py
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+
+SELECT_CACHE_DIR = "database/select_cache"
+SELECT_CACHE_MEMORY_BYTES = int(os.getenv("SELECT_CACHE_MEMORY_BYTES", str(64 * 1024 * 1024)))
+SELECT_CACHE_DISK_BYTES = int(os.getenv("SELECT_CACHE_DISK_BYTES", str(1024 * 1024 * 1024)))
+SELECT_CACHE_MAX_RESULT = int(os.getenv("SELECT_CACHE_MAX_RESULT", str(32 * 1024 * 1024)))
+REPLAY_CHUNK_SIZE = 64 * 1024
+# Bumped when cached results may have been wrong (2: scan ranges overlapped by one byte)
+CACHE_FORMAT = 2
+
+# digest -> (size, entry), most recently used last
+_memory = OrderedDict()
+_memory_bytes = 0
+_lock = threading.Lock()
+
+
+def cache_key(endpoint_url, bucket, key, etag, expression, input_serialization, output_serialization):
+    """
+    Digest identifying one query over one version of an object.
+    The ETag is part of the key, so a rewritten object never hits old results.
+    """
+    material = json.dumps(
+        [CACHE_FORMAT, endpoint_url or "", bucket, key, etag, expression, input_serialization, output_serialization],
+        sort_keys=True
+    )
+    return hashlib.sha256(material.encode()).hexdigest()
+
+
+def _disk_path(digest):
+    return os.path.join(SELECT_CACHE_DIR, digest + ".json")
+
+
+def _spill(digest, entry):
+    try:
+        os.makedirs(SELECT_CACHE_DIR, exist_ok=True)
+        tmp_path = _disk_path(digest) + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, _disk_path(digest))
+        _prune_disk()
+    except OSError as e:
+        print(f"Error spilling S3 Select result to disk: {e}")
+
+
+def _prune_disk():
+    files = []
+    for name in os.listdir(SELECT_CACHE_DIR):
+        if not name.endswith(".json"):
+            continue
+        stat = os.stat(os.path.join(SELECT_CACHE_DIR, name))
+        files.append((stat.st_mtime, stat.st_size, name))
+
+    total = sum(size for _, size, _ in files)
+    for _, size, name in sorted(files):
+        if total <= SELECT_CACHE_DISK_BYTES:
+            break
+        os.remove(os.path.join(SELECT_CACHE_DIR, name))
+        total -= size
+
+
+def _remember(digest, entry, size):
+    """Insert into the memory LRU; entries evicted from memory are spilled to disk."""
+    global _memory_bytes
+    evicted = []
+    with _lock:
+        if digest in _memory:
+            _memory_bytes -= _memory.pop(digest)[0]
+        _memory[digest] = (size, entry)
+        _memory_bytes += size
+        while _memory_bytes > SELECT_CACHE_MEMORY_BYTES and len(_memory) > 1:
+            old_digest, (old_size, old_entry) = _memory.popitem(last=False)
+            _memory_bytes -= old_size
+            evicted.append((old_digest, old_entry))
+
+    for old_digest, old_entry in evicted:
+        _spill(old_digest, old_entry)
+
+
+def get(digest):
+    """Return the cached entry ({"records", "stats"}) or None."""
+    with _lock:
+        cached = _memory.get(digest)
+        if cached is not None:
+            _memory.move_to_end(digest)
+            return cached[1]
+
+    path = _disk_path(digest)
+    try:
+        with open(path, encoding="utf-8") as f:
+            entry = json.load(f)
+        os.remove(path)
+    except (OSError, ValueError):
+        return None
+    _remember(digest, entry, len(entry["records"]))
+    return entry
+
+
+def replay(entry):
+    """Yield the events of a cached result in the same shape as a live query."""
+    records = entry["records"]
+    for start in range(0, len(records), REPLAY_CHUNK_SIZE):
+        yield {"type": "records", "data": records[start:start + REPLAY_CHUNK_SIZE]}
+    stats = entry.get("stats") or {"scanned": 0, "processed": 0, "returned": 0}
+    yield {"type": "stats", **stats, "cached": True}
+    yield {"type": "end", "cached": True}
+
+
+def record(digest, events):
+    """
+    Pass query events through unchanged and cache the result once it completes.
+    Results larger than SELECT_CACHE_MAX_RESULT, or that end in an error, are not cached.
+    """
+    chunks, size, stats = [], 0, None
+    cacheable = True
+    try:
+        for event in events:
+            event_type = event["type"]
+            if event_type == "records" and cacheable:
+                size += len(event["data"])
+                if size > SELECT_CACHE_MAX_RESULT:
+                    cacheable, chunks = False, []
+                else:
+                    chunks.append(event["data"])
+            elif event_type == "stats":
+                stats = {k: event[k] for k in ("scanned", "processed", "returned")}
+            elif event_type == "error":
+                cacheable = False
+            elif event_type == "end" and cacheable:
+                _remember(digest, {"records": "".join(chunks), "stats": stats}, size)
+            yield event
+    finally:
+        if hasattr(events, "close"):
+            events.close()
@@ -0,0 +1,234 @@
+# helpers/usage_index.py
+import sqlite3
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+from helpers.listing import plan_shards, list_shard_pages, LISTING_MAX_WORKERS
+
+USAGE_DB_FILE = "database/usage.db"
+
+
+def _connect():
+    conn = sqlite3.connect(USAGE_DB_FILE, timeout=30)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def _now():
+    return datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds")
+
+
+# --- Database init ---
+def init_usage_db():
+    conn = _connect()
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS bucket_usage (
+            endpoint_url TEXT NOT NULL,
+            access_key TEXT NOT NULL,
+            bucket_name TEXT NOT NULL,
+            total_size INTEGER DEFAULT 0,
+            total_objects INTEGER DEFAULT 0,
+            last_refreshed TEXT,
+            scan_started TEXT,
+            PRIMARY KEY (endpoint_url, access_key, bucket_name)
+        )
+    """)
+    # Per-shard checkpoints of the scan in progress; shards are listed concurrently
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS bucket_usage_shards (
+            endpoint_url TEXT NOT NULL,
+            access_key TEXT NOT NULL,
+            bucket_name TEXT NOT NULL,
+            shard_index INTEGER NOT NULL,
+            after_key TEXT,
+            upto_key TEXT,
+            last_key TEXT,
+            scan_size INTEGER DEFAULT 0,
+            scan_objects INTEGER DEFAULT 0,
+            done INTEGER DEFAULT 0,
+            PRIMARY KEY (endpoint_url, access_key, bucket_name, shard_index)
+        )
+    """)
+    # Scan checkpoints moved to bucket_usage_shards; drop the old single-cursor columns
+    columns = {row[1] for row in cur.execute("PRAGMA table_info(bucket_usage)").fetchall()}
+    for column in ("scan_size", "scan_objects", "last_key"):
+        if column in columns:
+            try:
+                cur.execute(f"ALTER TABLE bucket_usage DROP COLUMN {column}")
+            except sqlite3.OperationalError as e:
+                # SQLite before 3.35 cannot drop columns; they are simply left unused
+                print(f"Could not drop bucket_usage.{column}: {e}")
+    conn.commit()
+    conn.close()
+
+
+def get_account_usage(access_key, endpoint_url):
+    """Return {bucket_name: row} with the published totals of every indexed bucket."""
+    conn = _connect()
+    rows = conn.execute("""
+        SELECT bucket_name, total_size, total_objects, last_refreshed, scan_started
+        FROM bucket_usage WHERE endpoint_url = ? AND access_key = ?
+    """, (endpoint_url or "", access_key)).fetchall()
+    conn.close()
+    return {r["bucket_name"]: dict(r) for r in rows}
+
+
+def get_bucket_usage(bucket_name, access_key, endpoint_url):
+    conn = _connect()
+    row = conn.execute("""
+        SELECT bucket_name, total_size, total_objects, last_refreshed, scan_started
+        FROM bucket_usage WHERE endpoint_url = ? AND access_key = ? AND bucket_name = ?
+    """, (endpoint_url or "", access_key, bucket_name)).fetchone()
+    conn.close()
+    return dict(row) if row else None
+
+
+def sync_buckets(access_key, endpoint_url, bucket_names):
+    """Add rows for new buckets and drop rows of buckets that no longer exist."""
+    endpoint_url = endpoint_url or ""
+    conn = _connect()
+    cur = conn.cursor()
+    known = {r[0] for r in cur.execute(
+        "SELECT bucket_name FROM bucket_usage WHERE endpoint_url = ? AND access_key = ?",
+        (endpoint_url, access_key)
+    ).fetchall()}
+
+    for name in set(bucket_names) - known:
+        cur.execute("""
+            INSERT INTO bucket_usage (endpoint_url, access_key, bucket_name)
+            VALUES (?, ?, ?)
+        """, (endpoint_url, access_key, name))
+
+    for name in known - set(bucket_names):
+        for table in ("bucket_usage", "bucket_usage_shards"):
+            cur.execute(
+                f"DELETE FROM {table} WHERE endpoint_url = ? AND access_key = ? AND bucket_name = ?",
+                (endpoint_url, access_key, name)
+            )
+    conn.commit()
+    conn.close()
+
+
+def needs_refresh(row, max_age):
+    """True if the bucket is mid-scan, never scanned, or older than max_age seconds."""
+    if row.get("scan_started") or not row.get("last_refreshed"):
+        return True
+    refreshed = datetime.datetime.fromisoformat(row["last_refreshed"])
+    age = datetime.datetime.now(datetime.timezone.utc) - refreshed
+    return age.total_seconds() >= max_age
+
+
+def _scan_shard(s3, bucket_name, shard, max_pages):
+    """List one shard from its checkpoint for at most max_pages pages. Returns (size, objects, last_key, done)."""
+    size, objects, last_key = 0, 0, shard["last_key"]
+    pages = list_shard_pages(s3, bucket_name, "", (shard["after_key"], shard["upto_key"]), start_after=last_key)
+    done = True
+    for page_number, (contents, more) in enumerate(pages, start=1):
+        for obj in contents:
+            size += obj.get("Size", 0)
+            objects += 1
+            last_key = obj["Key"]
+        done = not more
+        if page_number >= max_pages:
+            break
+    pages.close()
+    return size, objects, last_key, done
+
+
+def _publish(cur, endpoint_url, access_key, bucket_name, total_size, total_objects):
+    cur.execute("""
+        UPDATE bucket_usage
+        SET total_size = ?, total_objects = ?, last_refreshed = ?, scan_started = NULL
+        WHERE endpoint_url = ? AND access_key = ? AND bucket_name = ?
+    """, (total_size, total_objects, _now(), endpoint_url, access_key, bucket_name))
+    cur.execute(
+        "DELETE FROM bucket_usage_shards WHERE endpoint_url = ? AND access_key = ? AND bucket_name = ?",
+        (endpoint_url, access_key, bucket_name)
+    )
+
+
+def publish_usage(access_key, endpoint_url, bucket_name, total_size, total_objects):
+    """Publish totals obtained without listing (see helpers.usage_providers), dropping any scan in progress."""
+    conn = _connect()
+    cur = conn.cursor()
+    _publish(cur, endpoint_url or "", access_key, bucket_name, total_size, total_objects)
+    conn.commit()
+    conn.close()
+
+
+def scan_step(s3, access_key, endpoint_url, bucket_name, max_pages):
+    """
+    Continue the bucket's scan from its checkpoints for at most max_pages listing pages per shard.
+
+    A bucket that fits in one listing page is published right away. Larger
+    buckets are split into key-range shards (see helpers.listing) that are
+    listed concurrently; each shard's partial totals and last key are saved
+    after every step so an interrupted scan resumes where it stopped. When
+    every shard is done the summed totals are published. Returns True once
+    the pass is complete.
+    """
+    endpoint_url = endpoint_url or ""
+    conn = _connect()
+    cur = conn.cursor()
+    row = cur.execute("""
+        SELECT scan_started FROM bucket_usage
+        WHERE endpoint_url = ? AND access_key = ? AND bucket_name = ?
+    """, (endpoint_url, access_key, bucket_name)).fetchone()
+    if not row:
+        conn.close()
+        return True
+
+    key = (endpoint_url, access_key, bucket_name)
+    shards = [dict(r) for r in cur.execute("""
+        SELECT shard_index, after_key, upto_key, last_key, scan_size, scan_objects, done
+        FROM bucket_usage_shards WHERE endpoint_url = ? AND access_key = ? AND bucket_name = ?
+        ORDER BY shard_index
+    """, key).fetchall()]
+
+    if not shards:
+        first = s3.list_objects_v2(Bucket=bucket_name)
+        if not first.get("IsTruncated"):
+            contents = first.get("Contents", [])
+            _publish(cur, *key, sum(obj.get("Size", 0) for obj in contents), len(contents))
+            conn.commit()
+            conn.close()
+            return True
+
+        for index, (after, upto) in enumerate(plan_shards(s3, bucket_name)):
+            shards.append({"shard_index": index, "after_key": after, "upto_key": upto, "last_key": None,
+                           "scan_size": 0, "scan_objects": 0, "done": 0})
+            cur.execute("""
+                INSERT INTO bucket_usage_shards (endpoint_url, access_key, bucket_name, shard_index, after_key, upto_key)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (*key, index, after, upto))
+        cur.execute("""
+            UPDATE bucket_usage SET scan_started = ?
+            WHERE endpoint_url = ? AND access_key = ? AND bucket_name = ?
+        """, (_now(), *key))
+        conn.commit()
+
+    pending = [shard for shard in shards if not shard["done"]]
+    if pending:
+        with ThreadPoolExecutor(max_workers=min(LISTING_MAX_WORKERS, len(pending))) as executor:
+            results = list(executor.map(lambda shard: _scan_shard(s3, bucket_name, shard, max_pages), pending))
+
+        for shard, (size, objects, last_key, done) in zip(pending, results):
+            shard["scan_size"] += size
+            shard["scan_objects"] += objects
+            shard["done"] = int(done)
+            cur.execute("""
+                UPDATE bucket_usage_shards
+                SET last_key = ?, scan_size = ?, scan_objects = ?, done = ?
+                WHERE endpoint_url = ? AND access_key = ? AND bucket_name = ? AND shard_index = ?
+            """, (last_key, shard["scan_size"], shard["scan_objects"], shard["done"], *key, shard["shard_index"]))
+
+    complete = all(shard["done"] for shard in shards)
+    if complete:
+        _publish(cur, *key, sum(s["scan_size"] for s in shards), sum(s["scan_objects"] for s in shards))
+    conn.commit()
+    conn.close()
+    return complete
+
+
+# --- Initialize DB on import ---
+init_usage_db()
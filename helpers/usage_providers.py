@@ -0,0 +1,205 @@
+# helpers/usage_providers.py
+import os
+import json
+import threading
+from urllib.parse import urlencode
+from concurrent.futures import ThreadPoolExecutor
+import urllib3
+from cachetools import TTLCache
+from botocore.auth import S3SigV4Auth
+from botocore.awsrequest import AWSRequest
+from botocore.credentials import Credentials
+from helpers.clients import get_client, secret_digest
+
+USAGE_PROVIDER = os.getenv("USAGE_PROVIDER", "auto")
+USAGE_PROVIDER_TTL = int(os.getenv("USAGE_PROVIDER_TTL", "3600"))
+USAGE_PROVIDER_TIMEOUT = int(os.getenv("USAGE_PROVIDER_TIMEOUT", "5"))
+USAGE_HEAD_WORKERS = 16
+SIGNING_REGION = "us-east-1"
+
+# Backend-native usage sources, in probing order. "listing" (scan every object) is the fallback.
+PROVIDERS = ("rgw_admin", "minio_admin", "rgw_head")
+LISTING = "listing"
+
+# Detected provider per (endpoint_url, access_key, secret digest); re-probed after USAGE_PROVIDER_TTL
+_provider_cache = TTLCache(maxsize=1024, ttl=USAGE_PROVIDER_TTL)
+_provider_lock = threading.Lock()
+# Cache keys with a probe running, so logins and the refresher do not probe twice at once
+_probing = set()
+_http = urllib3.PoolManager()
+
+
+class UnsupportedProvider(Exception):
+    """The endpoint does not offer this usage source to these credentials."""
+
+
+def _signed_request(method, endpoint_url, path, params, access_key, secret_key):
+    """Send a SigV4-signed request to a non-S3 path of the endpoint (admin APIs)."""
+    url = endpoint_url.rstrip("/") + path
+    if params:
+        url += "?" + urlencode(params)
+    request = AWSRequest(method=method, url=url)
+    S3SigV4Auth(Credentials(access_key, secret_key), "s3", SIGNING_REGION).add_auth(request)
+    response = _http.request(method, url, headers=dict(request.headers.items()),
+                             timeout=USAGE_PROVIDER_TIMEOUT, retries=False)
+    if response.status != 200:
+        raise UnsupportedProvider(f"{method} {path}: HTTP {response.status}")
+    return response
+
+
+def _rgw_admin_usage(access_key, secret_key, endpoint_url, bucket_names):
+    """Ceph RGW admin ops API: GET /admin/bucket?stats=true, one request for every bucket."""
+    response = _signed_request("GET", endpoint_url, "/admin/bucket", {"stats": "true", "format": "json"},
+                               access_key, secret_key)
+    wanted = set(bucket_names)
+    usage = {}
+    for bucket in json.loads(response.data):
+        if not isinstance(bucket, dict) or bucket.get("bucket") not in wanted:
+            continue
+        main = (bucket.get("usage") or {}).get("rgw.main", {})
+        usage[bucket["bucket"]] = (main.get("size", 0), main.get("num_objects", 0))
+    return usage
+
+
+def _minio_admin_usage(access_key, secret_key, endpoint_url, bucket_names):
+    """
+    MinIO admin API: GET /minio/admin/v3/datausageinfo. The figures come
+    from MinIO's background scanner, so they are as fresh as its last cycle.
+    """
+    response = _signed_request("GET", endpoint_url, "/minio/admin/v3/datausageinfo", None, access_key, secret_key)
+    info = json.loads(response.data)
+    if not isinstance(info, dict) or "bucketsUsageInfo" not in info:
+        raise UnsupportedProvider("datausageinfo: unexpected response")
+    usage = {}
+    for name, bucket in (info.get("bucketsUsageInfo") or {}).items():
+        if name in bucket_names:
+            usage[name] = (bucket.get("size", 0), bucket.get("objectsCount", 0))
+    return usage
+
+
+def _rgw_head_stats(access_key, secret_key, endpoint_url, bucket_name):
+    response = _signed_request("HEAD", endpoint_url, f"/{bucket_name}", {"read-stats": "true"},
+                               access_key, secret_key)
+    headers = response.headers
+    if "X-RGW-Bytes-Used" not in headers or "X-RGW-Object-Count" not in headers:
+        raise UnsupportedProvider("HEAD bucket: no X-RGW usage headers")
+    return int(headers["X-RGW-Bytes-Used"]), int(headers["X-RGW-Object-Count"])
+
+
+def _rgw_head_stats_or_none(access_key, secret_key, endpoint_url, bucket_name):
+    try:
+        return _rgw_head_stats(access_key, secret_key, endpoint_url, bucket_name)
+    except Exception as e:
+        print(f"No HEAD usage statistics for bucket {bucket_name}: {e}")
+        return None
+
+
+def _rgw_head_usage(access_key, secret_key, endpoint_url, bucket_names):
+    """
+    Ceph RGW HEAD bucket statistics headers, one request per bucket; works without admin caps.
+    Buckets that answer without the headers or fail are left out, so only they are listed.
+    """
+    if not bucket_names:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(USAGE_HEAD_WORKERS, len(bucket_names))) as executor:
+        stats = list(executor.map(
+            lambda name: _rgw_head_stats_or_none(access_key, secret_key, endpoint_url, name), bucket_names
+        ))
+    return {name: usage for name, usage in zip(bucket_names, stats) if usage is not None}
+
+
+_FETCHERS = {
+    "rgw_admin": _rgw_admin_usage,
+    "minio_admin": _minio_admin_usage,
+    "rgw_head": _rgw_head_usage,
+}
+
+
+def fetch_usage(provider, access_key, secret_key, endpoint_url, bucket_names):
+    """
+    Return {bucket_name: (size_bytes, object_count)} from a native provider.
+    Buckets the provider does not report are left out and should be listed instead.
+    """
+    return _FETCHERS[provider](access_key, secret_key, endpoint_url, list(bucket_names))
+
+
+def _cache_key(access_key, secret_key, endpoint_url):
+    return endpoint_url or "", access_key, secret_digest(secret_key)
+
+
+def probe_usage_provider(access_key, secret_key, endpoint_url, bucket_names=None):
+    """
+    Detect the cheapest usage source the endpoint offers these credentials and cache it.
+
+    Each native provider is tried in PROVIDERS order with one real request;
+    the first that answers wins. AWS itself (no endpoint URL) and endpoints
+    without any native source use "listing". USAGE_PROVIDER overrides the
+    detection. A "listing" result is not cached when the account had no
+    bucket to probe rgw_head with, so the next refresh probes again.
+    """
+    cacheable = True
+    if USAGE_PROVIDER != "auto":
+        provider = USAGE_PROVIDER
+    elif not endpoint_url:
+        provider = LISTING
+    else:
+        provider = LISTING
+        try:
+            if bucket_names is None:
+                s3 = get_client("s3", aws_access_key_id=access_key, aws_secret_access_key=secret_key,
+                                endpoint_url=endpoint_url, region_name=SIGNING_REGION)
+                bucket_names = [b["Name"] for b in s3.list_buckets().get("Buckets", [])]
+        except Exception as e:
+            print(f"Error listing buckets for usage provider probe: {e}")
+            bucket_names = []
+
+        for candidate in PROVIDERS:
+            try:
+                # rgw_head answers per bucket; one is enough to tell
+                usage = fetch_usage(candidate, access_key, secret_key, endpoint_url,
+                                    bucket_names[:1] if candidate == "rgw_head" else bucket_names)
+            except Exception:
+                continue
+            # rgw_head leaves out buckets without statistics instead of failing
+            if candidate == "rgw_head" and not usage:
+                continue
+            provider = candidate
+            break
+        cacheable = provider != LISTING or bool(bucket_names)
+
+    if cacheable:
+        with _provider_lock:
+            _provider_cache[_cache_key(access_key, secret_key, endpoint_url)] = provider
+    return provider
+
+
+def _probe_once(access_key, secret_key, endpoint_url):
+    key = _cache_key(access_key, secret_key, endpoint_url)
+    try:
+        probe_usage_provider(access_key, secret_key, endpoint_url)
+    except Exception as e:
+        print(f"Error probing usage provider of {endpoint_url}: {e}")
+    finally:
+        with _provider_lock:
+            _probing.discard(key)
+
+
+def probe_in_background(access_key, secret_key, endpoint_url):
+    """Start probe_usage_provider on a daemon thread, e.g. at login, unless one is running or cached."""
+    key = _cache_key(access_key, secret_key, endpoint_url)
+    with _provider_lock:
+        if key in _probing or key in _provider_cache:
+            return
+        _probing.add(key)
+    threading.Thread(
+        target=_probe_once, args=(access_key, secret_key, endpoint_url), name="usage-probe", daemon=True
+    ).start()
+
+
+def get_usage_provider(access_key, secret_key, endpoint_url, bucket_names=None):
+    """Cached provider of an account, probing it if login did not or the entry expired."""
+    with _provider_lock:
+        provider = _provider_cache.get(_cache_key(access_key, secret_key, endpoint_url))
+    if provider is not None:
+        return provider
+    return probe_usage_provider(access_key, secret_key, endpoint_url, bucket_names)
@@ -1,8 +1,7 @@
 from flask import Blueprint, render_template, request, session
 from helpers.auth import login_required
 import sqlite3
-import boto3
-from botocore.exceptions import ClientError
+from helpers.clients import get_client
 import json
 import datetime
 from zoneinfo import ZoneInfo
@@ -21,19 +20,7 @@ def get_user_arn_from_session():
     if not access_key or not secret_key or not endpoint:
         return None
 
-    iam_client = boto3.client(
-        "iam",
-        aws_access_key_id=access_key,
-        aws_secret_access_key=secret_key,
-        endpoint_url=endpoint,
-        region_name="default"
-    )
-    try:
-        response = iam_client.get_user()
-        user = response['User']
-        return user.get('Arn', '')
-    except ClientError:
-        return None
+    return get_user_type(access_key, secret_key, endpoint).get("Arn")
 
 
 def user_in_principal(user_arn, principal_json):
@@ -109,7 +96,7 @@ def assume_role(role_arn, session_name, duration_seconds):
     access_key = session.get("access_key")
     secret_key = session.get("secret_key")
     endpoint = session.get("endpoint_url")
-    client = boto3.client(
+    client = get_client(
         'sts',
         aws_access_key_id=access_key,
         aws_secret_access_key=secret_key,
@@ -1,6 +1,8 @@
 from flask import Blueprint, render_template, request, redirect, url_for, session, flash
-from helpers.aws import check_credentials
+from helpers.aws import check_credentials, invalidate_user_type
 from helpers.auth import login_required
+from helpers.dashboard import untrack_account
+from routes.manage_sts_permission import unregister_sync_account
 
 auth_bp = Blueprint("auth", __name__)
 
@@ -29,5 +31,8 @@ def login():
 @auth_bp.route("/logout")
 @login_required
 def logout():
+    invalidate_user_type(session.get("access_key"), session.get("endpoint_url"))
+    untrack_account(session.get("access_key"), session.get("endpoint_url"))
+    unregister_sync_account(session.get("access_key"), session.get("endpoint_url"))
     session.clear()
     return redirect(url_for("auth.login"))
@@ -1,53 +1,142 @@
 
-from flask import Blueprint, render_template, session, redirect, url_for, flash, request, jsonify, json, abort
+import os
+import time
+from flask import Blueprint, render_template, session, redirect, url_for, flash, request, jsonify, json, abort, Response, stream_with_context
 from helpers.auth import login_required
-from helpers.aws import get_buckets_info, get_user_type, create_bucket,get_iam_client
+from helpers.aws import get_buckets_info, get_user_type, create_bucket, refresh_bucket_info, drop_bucket_info
 from helpers.aws import get_s3_client
 from botocore.exceptions import ClientError
-from helpers.dashboard import get_object_count_data, get_bucket_data , get_bucket_size_and_count
+from helpers.iam import list_users, list_groups
+from helpers.dashboard import get_object_count_data, get_bucket_data, get_dashboard_snapshot, snapshot_age, filter_bucket_data, wake_refresher
+from helpers.dashboard import wait_for_snapshot, snapshot_delta
+from helpers.jobs import submit_job
 from flask import request, jsonify
 import botocore.exceptions
 
 bucket_bp = Blueprint("bucket", __name__)
 
+DASHBOARD_EVENTS_HEARTBEAT = int(os.getenv("DASHBOARD_EVENTS_HEARTBEAT", "15"))
+DASHBOARD_EVENTS_MAX_AGE = int(os.getenv("DASHBOARD_EVENTS_MAX_AGE", "600"))
+
+def _iam_counts():
+    try:
+        iam_users_count = len(list_users(session["access_key"], session["secret_key"], session["endpoint_url"]))
+    except Exception as e:
+        print(f"Error fetching IAM users: {e}")
+        iam_users_count = 0
+
+    try:
+        iam_groups_count = len(list_groups(session["access_key"], session["secret_key"], session["endpoint_url"]))
+    except Exception as e:
+        print(f"Error fetching IAM groups: {e}")
+        iam_groups_count = 0
+    return iam_users_count, iam_groups_count
+
+
+def _snapshot_payload(snapshot, iam_counts):
+    iam_users_count, iam_groups_count = iam_counts
+    return {
+        "version": snapshot["version"],
+        "generated_at": snapshot["generated_at"],
+        "age_seconds": snapshot_age(snapshot),
+        "bucket_count": snapshot["bucket_count"],
+        "total_size_mb": round(snapshot["total_size_bytes"] / (1024 * 1024), 2),
+        "iam_users_count": iam_users_count,
+        "iam_groups_count": iam_groups_count
+    }
+
+
+@bucket_bp.route("/api/dashboard_snapshot", methods=["GET"])
+@login_required
+def api_dashboard_snapshot():
+    """
+    Everything the dashboard shows, from the precomputed snapshot.
+    Query param: search (bucket name filter; without it the five largest buckets are returned).
+    """
+    try:
+        snapshot = get_dashboard_snapshot()
+    except Exception as e:
+        print(f"Error in api_dashboard_snapshot: {e}")
+        return jsonify({"error": "Failed to get dashboard snapshot"}), 500
+
+    payload = _snapshot_payload(snapshot, _iam_counts())
+    payload["buckets"] = filter_bucket_data(snapshot["buckets"], request.args.get("search", "").strip())
+    return jsonify(payload)
+
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@bucket_bp.route("/api/dashboard_events", methods=["GET"])
+@login_required
+def api_dashboard_events():
+    """
+    Server-sent events stream of dashboard changes.
+
+    Sends the full snapshot ("snapshot" event, all buckets) once, then a
+    "delta" event with changed and removed buckets only when the usage
+    refresher produces different statistics. Every viewer of an account
+    waits on the same snapshot, so idle dashboards cost no backend calls.
+    The stream ends after DASHBOARD_EVENTS_MAX_AGE seconds and the browser
+    reconnects on its own.
+    """
+    try:
+        snapshot = get_dashboard_snapshot()
+    except Exception as e:
+        print(f"Error in api_dashboard_events: {e}")
+        return jsonify({"error": "Failed to get dashboard snapshot"}), 500
+
+    access_key, endpoint_url = session["access_key"], session["endpoint_url"]
+
+    def generate(snapshot):
+        payload = _snapshot_payload(snapshot, _iam_counts())
+        payload["buckets"] = snapshot["buckets"]
+        yield "retry: 3000\n\n"
+        yield _sse("snapshot", payload)
+
+        deadline = time.monotonic() + DASHBOARD_EVENTS_MAX_AGE
+        while time.monotonic() < deadline:
+            newer = wait_for_snapshot(access_key, endpoint_url, snapshot["version"], DASHBOARD_EVENTS_HEARTBEAT)
+            if newer is None:
+                # Comment line keeps proxies from closing an idle connection
+                yield ": keep-alive\n\n"
+                continue
+            payload = _snapshot_payload(newer, _iam_counts())
+            payload.update(snapshot_delta(snapshot, newer))
+            snapshot = newer
+            yield _sse("delta", payload)
+
+    return Response(
+        stream_with_context(generate(snapshot)),
+        mimetype="text/event-stream",
+        headers={"X-Accel-Buffering": "no", "Cache-Control": "no-cache"}
+    )
+
+
+@bucket_bp.route("/api/rescan_usage", methods=["POST"])
+@login_required
+def api_rescan_usage():
+    """Start a background job that rescans the usage of every bucket; the dashboard stream shows the results."""
+    job_id = submit_job("rescan_usage", {}, session["access_key"], session["secret_key"], session["endpoint_url"])
+    return jsonify({"success": True, "job_id": job_id})
+
+
 @bucket_bp.route("/api/overview_stats", methods=["GET"])
 @login_required
 def api_overview_stats():
     try:
-        s3 = get_s3_client()
-        all_buckets = s3.list_buckets().get("Buckets", [])
-        bucket_count = len(all_buckets)
-        
-        total_size_bytes = 0
-        for bucket in all_buckets:
-            size_bytes, _ = get_bucket_size_and_count(bucket["Name"])
-            total_size_bytes += size_bytes
-        
-        total_size_mb = total_size_bytes / (1024 * 1024)
-        
-        iam_client = get_iam_client(
-            session["access_key"],
-            session["secret_key"], 
-            session["endpoint_url"]
-        )
-        
-        try:
-            users_resp = iam_client.list_users()
-            iam_users_count = len(users_resp.get("Users", []))
-        except Exception:
-            iam_users_count = 0
-        
-        try:
-            groups_resp = iam_client.list_groups()
-            iam_groups_count = len(groups_resp.get("Groups", []))
-        except Exception:
-            iam_groups_count = 0
+        snapshot = get_dashboard_snapshot()
+        bucket_count = snapshot["bucket_count"]
+        total_size_mb = snapshot["total_size_bytes"] / (1024 * 1024)
+        iam_users_count, iam_groups_count = _iam_counts()
         
         return jsonify({
             "bucket_count": bucket_count,
             "total_size_mb": round(total_size_mb, 2),
             "iam_users_count": iam_users_count,
-            "iam_groups_count": iam_groups_count
+            "iam_groups_count": iam_groups_count,
+            "age_seconds": snapshot_age(snapshot)
         })
     except Exception as e:
         print(f"Error in api_overview_stats: {e}")
@@ -80,11 +169,13 @@ def api_object_count_data():
 @bucket_bp.route("/home")
 @login_required
 def home():
-    bucket_data = get_bucket_data("")
-    bucket_count = len(bucket_data)
-    
-    total_size_gb = sum(bucket["Size_GB"] for bucket in bucket_data)
-    total_size_mb = total_size_gb * 1024 
+    try:
+        snapshot = get_dashboard_snapshot()
+        bucket_count = snapshot["bucket_count"]
+        total_size_mb = snapshot["total_size_bytes"] / (1024 * 1024)
+    except Exception as e:
+        print(f"Error loading dashboard snapshot: {e}")
+        bucket_count, total_size_mb = 0, 0
     
     # User info
     user_info = get_user_type(
@@ -93,28 +184,7 @@ def home():
         session["endpoint_url"]
     )
 
-    # IAM Client
-    iam_client = get_iam_client(
-        session["access_key"],
-        session["secret_key"],
-        session["endpoint_url"]
-    )
-
-    # IAM Users count
-    try:
-        users_resp = iam_client.list_users()
-        iam_users_count = len(users_resp.get("Users", []))
-    except Exception as e:
-        print(f"Error fetching IAM users: {e}")
-        iam_users_count = 0
-
-    # IAM Groups count
-    try:
-        groups_resp = iam_client.list_groups()
-        iam_groups_count = len(groups_resp.get("Groups", []))
-    except Exception as e:
-        print(f"Error fetching IAM groups: {e}")
-        iam_groups_count = 0
+    iam_users_count, iam_groups_count = _iam_counts()
 
     return render_template(
         "index.html", 
@@ -124,7 +194,10 @@ def home():
         iam_groups_count=iam_groups_count,
         user_info=user_info,
         dashboard_api_bucket_url=url_for("bucket.api_bucket_data"),
-        dashboard_api_object_count_url=url_for("bucket.api_object_count_data")
+        dashboard_api_object_count_url=url_for("bucket.api_object_count_data"),
+        dashboard_api_snapshot_url=url_for("bucket.api_dashboard_snapshot"),
+        dashboard_api_events_url=url_for("bucket.api_dashboard_events"),
+        dashboard_api_rescan_url=url_for("bucket.api_rescan_usage")
     )
 
 
@@ -132,8 +205,7 @@ def home():
 @login_required
 def buckets():
     try:
-        session.pop("buckets_info", None)
-        buckets_info = get_buckets_info()
+        buckets_info = get_buckets_info(refresh=request.args.get("refresh") == "1")
         user_info = get_user_type(session["access_key"], session["secret_key"], session["endpoint_url"])
         return render_template("tables.html", buckets=buckets_info, user_info=user_info)
     except botocore.exceptions.ClientError as e:
@@ -166,7 +238,10 @@ def create_bucket_route():
     secret_key = session.get("secret_key")
 
     response = create_bucket(endpoint, access_key, secret_key, bucket_name, region, enable_locking)
-    
+    if response.get("success"):
+        refresh_bucket_info(bucket_name)
+        wake_refresher()
+
     return jsonify(response)
 
 
@@ -192,13 +267,13 @@ def delete_bucket_route():
         if objects.get("KeyCount", 0) > 0:
             return jsonify({
                 "success": False,
-                "message": f"❌ Bucket '{bucket_name}' is not empty. Please empty it before deletion."
+                "message": f"❌ Bucket '{bucket_name}' is not empty. Please empty it before deletion (Objects → Empty bucket)."
             }), 400
 
         # Delete bucket
         s3.delete_bucket(Bucket=bucket_name)
-        # Refresh session cache if needed
-        session.pop("buckets_info", None)
+        drop_bucket_info(bucket_name)
+        wake_refresher()
         return jsonify({"success": True, "message": f"✅ Bucket '{bucket_name}' deleted successfully!"})
 
     except ClientError as e:
@@ -239,8 +314,7 @@ def toggle_versioning():
             Bucket=bucket_name,
             VersioningConfiguration={"Status": status}
         )
-        # Refresh cache
-        session.pop("buckets_info", None)
+        refresh_bucket_info(bucket_name, ["Versioning"])
         return jsonify({
             "success": True,
             "message": f"✅ Versioning for bucket '{bucket_name}' set to '{status}'."
@@ -258,7 +332,6 @@ def toggle_versioning():
 @bucket_bp.route("/api/get_bucket_versioning")
 @login_required
 def get_bucket_versioning():
-    session.pop("buckets_info", None)
     bucket_name = request.args.get("bucket_name")
     s3 = get_s3_client()
     try:
@@ -296,7 +369,7 @@ def add_bucket_tag():
 
         s3.put_bucket_tagging(Bucket=bucket_name, Tagging={"TagSet": new_tags})
 
-        session.pop("buckets_info", None)
+        refresh_bucket_info(bucket_name, ["Tags"])
 
         return jsonify({"success": True, "message": f"✅ Tag ({tag_key}={tag_value}) added to {bucket_name}."})
     except ClientError as e:
@@ -331,7 +404,7 @@ def delete_bucket_tag():
         else:
             s3.delete_bucket_tagging(Bucket=bucket_name)
 
-        session.pop("buckets_info", None)
+        refresh_bucket_info(bucket_name, ["Tags"])
 
         return jsonify({"success": True, "message": f"✅ Tag '{tag_key}' deleted from {bucket_name}."})
 
@@ -368,7 +441,6 @@ def get_bucket_tags():
 @bucket_bp.route("/get_bucket_policies", methods=["POST", "GET"])
 @login_required
 def get_bucket_policies():
-    session.pop("buckets_info", None)
     bucket_name = request.get_json().get("bucket_name") if request.method=="POST" else request.args.get("bucket_name")
     if not bucket_name:
         return jsonify({"success": False, "message": "Bucket name required"}), 400
@@ -387,7 +459,6 @@ def get_bucket_policies():
 @bucket_bp.route("/set_bucket_policy", methods=["POST"])
 @login_required
 def add_bucket_policy():
-    session.pop("buckets_info", None)
     data = request.get_json(silent=True) or {}
     bucket_name = data.get("bucket_name")
     policy = data.get("policy")
@@ -397,7 +468,7 @@ def add_bucket_policy():
     s3 = get_s3_client()
     try:
         s3.put_bucket_policy(Bucket=bucket_name, Policy=policy)
-        session.pop("buckets_info", None)
+        refresh_bucket_info(bucket_name, ["Policy"])
         return jsonify({"success": True, "message": f"✅ Policy added to {bucket_name}"})
     except Exception as e:
         return jsonify({"success": False, "message": str(e)}), 400
@@ -414,7 +485,7 @@ def delete_bucket_policy():
     s3 = get_s3_client()
     try:
         s3.delete_bucket_policy(Bucket=bucket_name)
-        session.pop("buckets_info", None)
+        refresh_bucket_info(bucket_name, ["Policy"])
         return jsonify({"success": True, "message": f"✅ Policy deleted from {bucket_name}"})
     except ClientError as e:
         code = e.response.get("Error", {}).get("Code")
@@ -461,7 +532,7 @@ def set_bucket_lifecycle():
         lifecycle_dict = {"Rules": lifecycle}
 
         s3.put_bucket_lifecycle_configuration(Bucket=bucket_name, LifecycleConfiguration=lifecycle_dict)
-        session.pop("buckets_info", None)
+        refresh_bucket_info(bucket_name, ["Lifecycle"])
         return jsonify({"success": True, "message": f"✅ Lifecycle added to {bucket_name}"})
     except Exception as e:
         return jsonify({"success": False, "message": str(e)}), 400
@@ -470,7 +541,6 @@ def set_bucket_lifecycle():
 @bucket_bp.route("/delete_bucket_lifecycle", methods=["POST"])
 @login_required
 def delete_bucket_lifecycle():
-    session.pop("buckets_info", None)
     data = request.get_json(silent=True) or {}
     bucket_name = data.get("bucket_name")
     if not bucket_name:
@@ -479,6 +549,7 @@ def delete_bucket_lifecycle():
     s3 = get_s3_client()
     try:
         s3.delete_bucket_lifecycle(Bucket=bucket_name) 
+        refresh_bucket_info(bucket_name, ["Lifecycle"])
         return jsonify({"success": True, "message": f"✅ Lifecycle deleted from {bucket_name}"})
     except ClientError as e:
         code = e.response.get("Error", {}).get("Code")
@@ -510,8 +581,7 @@ def apply_replication_rule():
             Bucket=bucket_name,
             ReplicationConfiguration=replication_config
         )
-        # refresh cache
-        session.pop("buckets_info", None)
+        refresh_bucket_info(bucket_name, ["Replication"])
         return jsonify({"success": True, "message": f"✅ Replication rule applied to {bucket_name}"})
     except ClientError as e:
         error_code = e.response.get("Error", {}).get("Code", "Unknown")
@@ -566,7 +636,7 @@ def delete_bucket_replication():
     s3 = get_s3_client()
     try:
         s3.delete_bucket_replication(Bucket=bucket_name)
-        session.pop("buckets_info", None)
+        refresh_bucket_info(bucket_name, ["Replication"])
         return jsonify({"success": True, "message": f"✅ Replication rules deleted from {bucket_name}"})
     except ClientError as e:
         error_code = e.response.get("Error", {}).get("Code", "Unknown")
@@ -621,8 +691,6 @@ def configure_locking():
             ObjectLockConfiguration=lock_config
         )
 
-        session.pop("buckets_info", None)
-
         return jsonify({
             "success": True,
             "message": f"✅ Locking configured: {mode} for {days} days on {bucket}"
@@ -2,48 +2,45 @@
 from flask import Blueprint, render_template, session, jsonify, request, json
 from helpers.auth import login_required
 from helpers.aws import get_iam_client, get_user_type
+from helpers.iam import invalidate_iam_cache, get_group_membership, list_users
 
 iam_groups_bp = Blueprint("iam_groups", __name__)
 
+
+@iam_groups_bp.after_request
+def invalidate_groups_cache(response):
+    """Group changes alter the membership index and the group lists shown on the users page."""
+    if request.method == "POST" and session.get("access_key"):
+        invalidate_iam_cache(session["access_key"], session.get("endpoint_url"))
+    return response
+
+
 @iam_groups_bp.route("/iam_groups")
 @login_required
 def iam_groups():
     user_info = get_user_type(session["access_key"], session["secret_key"], session["endpoint_url"])
 
-    iam_client = get_iam_client(
-        session["access_key"],
-        session["secret_key"],
-        session["endpoint_url"]
-    )
-
     try:
-        groups_resp = iam_client.list_groups()
-        groups_list = groups_resp.get("Groups", [])
+        membership = get_group_membership(
+            session["access_key"],
+            session["secret_key"],
+            session["endpoint_url"],
+            refresh=request.args.get("refresh") == "1"
+        )
     except Exception as e:
         return render_template("iam_groups.html", user_info=user_info, iam_groups=[], error=str(e))
 
     try:
-        users_resp = iam_client.list_users()
-        all_users = users_resp.get("Users", [])
+        all_users = list_users(session["access_key"], session["secret_key"], session["endpoint_url"])
     except Exception as e:
         all_users = []
         print(f"Failed to list users: {e}")
 
     enriched_groups = []
-    for g in groups_list:
+    for g in membership["groups"]:
         group_name = g.get("GroupName")
-        members = []
-        error = None
-
-        for user in all_users:
-            username = user["UserName"]
-            try:
-                user_groups = iam_client.list_groups_for_user(UserName=username).get("Groups", [])
-                group_names = [grp["GroupName"] for grp in user_groups]
-                if group_name in group_names:
-                    members.append(username)
-            except Exception as e:
-                error = str(e)
+        members = membership["members"].get(group_name, [])
+        error = membership["errors"].get(group_name)
 
         group_copy = g.copy()
         group_copy["Members"] = members
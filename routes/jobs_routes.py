@@ -0,0 +1,31 @@
+# routes/jobs_routes.py
+from flask import Blueprint, session, jsonify
+from helpers.auth import login_required
+from helpers.jobs import get_job, list_jobs, cancel_job
+
+jobs_bp = Blueprint("jobs", __name__)
+
+
+@jobs_bp.route("/jobs", methods=["GET"])
+@login_required
+def jobs_list():
+    """Recent background jobs of the logged-in account, newest first."""
+    return jsonify({"success": True, "jobs": list_jobs(session["access_key"], session["endpoint_url"])})
+
+
+@jobs_bp.route("/jobs/<job_id>", methods=["GET"])
+@login_required
+def job_status(job_id):
+    """State, progress, result or error of one background job."""
+    job = get_job(job_id, session["access_key"], session["endpoint_url"])
+    if job is None:
+        return jsonify({"success": False, "message": "❌ Unknown job."}), 404
+    return jsonify({"success": True, "job": job})
+
+
+@jobs_bp.route("/jobs/<job_id>/cancel", methods=["POST"])
+@login_required
+def job_cancel(job_id):
+    if not cancel_job(job_id, session["access_key"], session["endpoint_url"]):
+        return jsonify({"success": False, "message": "❌ Job is not running."}), 400
+    return jsonify({"success": True, "message": "🛑 Job is stopping."})
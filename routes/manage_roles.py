@@ -1,7 +1,7 @@
 # routes/manage_iam_roles.py
 from flask import Blueprint, render_template, request, jsonify, session, current_app
 from helpers.auth import login_required
-import boto3
+from helpers.clients import get_client
 from botocore.exceptions import ClientError
 import json
 from helpers.aws import get_user_type
@@ -11,7 +11,7 @@ manage_iam_bp = Blueprint("manage_iam", __name__)
 
 # --- Helpers ---
 def get_iam_client():
-    """Return a boto3 IAM client using credentials from session."""
+    """Return a pooled boto3 IAM client using credentials from session."""
     access_key = session.get("access_key")
     secret_key = session.get("secret_key")
     endpoint_url = session.get("endpoint_url")
@@ -20,7 +20,7 @@ def get_iam_client():
     if not access_key or not secret_key:
         raise ValueError("AWS credentials not found in session")
 
-    return boto3.client(
+    return get_client(
         "iam",
         aws_access_key_id=access_key,
         aws_secret_access_key=secret_key,
@@ -29,7 +29,7 @@ def get_iam_client():
     )
 
 def get_s3_client():
-    """Return a boto3 S3 client using credentials from session."""
+    """Return a pooled boto3 S3 client using credentials from session."""
     access_key = session.get("access_key")
     secret_key = session.get("secret_key")
     endpoint_url = session.get("endpoint_url")
@@ -38,7 +38,7 @@ def get_s3_client():
     if not access_key or not secret_key:
         raise ValueError("AWS credentials not found in session")
 
-    return boto3.client(
+    return get_client(
         "s3",
         aws_access_key_id=access_key,
         aws_secret_access_key=secret_key,
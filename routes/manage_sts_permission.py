@@ -1,14 +1,30 @@
 # routes /manage_sts_permissions.py
 from flask import Blueprint, render_template, request, jsonify, session, current_app
 from helpers.auth import login_required
+import os
 import sqlite3
 import json
-import boto3
+import time
+import hashlib
+import threading
+from helpers.clients import get_client
 from helpers.aws import get_user_type
+from helpers.background import start_periodic_worker
+from helpers.jobs import register_job_kind, submit_job
 
 
 manage_bp = Blueprint("manage", __name__)
 DB_FILE = "database/roles.db"
+ROLE_SYNC_INTERVAL = int(os.getenv("ROLE_SYNC_INTERVAL", "300"))
+ROLE_SYNC_IDLE = int(os.getenv("ROLE_SYNC_IDLE", "1800"))
+
+# Root accounts whose roles are synced in the background: (endpoint_url, access_key) ->
+# (secret_key, last seen). Kept in memory only; dropped on logout or after ROLE_SYNC_IDLE
+# seconds without a request from the account.
+_sync_accounts = {}
+_sync_accounts_lock = threading.Lock()
+_sync_lock = threading.Lock()
+_sync_wake = None
 
 # --- Database init ---
 def init_db():
@@ -24,7 +40,8 @@ def init_db():
             principal TEXT,
             assume_permission TEXT,
             assumed_users TEXT,
-            assume_history TEXT
+            assume_history TEXT,
+            trust_hash TEXT
         )
     """)
     cur.execute("""
@@ -34,24 +51,71 @@ def init_db():
             user_arn TEXT UNIQUE
         )
     """)
+    # Databases created before change detection or per-account syncs lack these columns.
+    # endpoint_url/access_key record the root account whose sync owns a row, so one
+    # account's sync never deletes another account's roles and users.
+    role_columns = {row[1] for row in cur.execute("PRAGMA table_info(roles)").fetchall()}
+    for column in ("trust_hash", "endpoint_url", "access_key"):
+        if column not in role_columns:
+            cur.execute(f"ALTER TABLE roles ADD COLUMN {column} TEXT")
+    user_columns = {row[1] for row in cur.execute("PRAGMA table_info(users)").fetchall()}
+    for column in ("endpoint_url", "access_key"):
+        if column not in user_columns:
+            cur.execute(f"ALTER TABLE users ADD COLUMN {column} TEXT")
     conn.commit()
     conn.close()
 
 
-# --- Helper to get boto3 client using session ---
-def get_iam_client():
-    return boto3.client(
+# --- Helper to get boto3 client using session or explicit credentials ---
+def get_iam_client(access_key=None, secret_key=None, endpoint_url=None):
+    if access_key is None:
+        access_key = session.get("access_key")
+        secret_key = session.get("secret_key")
+        endpoint_url = session.get("endpoint_url")
+    return get_client(
         "iam",
-        aws_access_key_id=session.get("access_key"),
-        aws_secret_access_key=session.get("secret_key"),
-        endpoint_url=session.get("endpoint_url"),
+        aws_access_key_id=access_key,
+        aws_secret_access_key=secret_key,
+        endpoint_url=endpoint_url,
         region_name="us-east-1"
     )
 
 
+def _arn_account(arn):
+    """The "arn:partition:iam::account:" part of an IAM ARN, identifying the account (or RGW tenant)."""
+    return ":".join(arn.split(":")[:5]) + ":"
+
+
+def _drop_legacy_rows(cur, synced_arns):
+    """
+    Delete rows saved before rows recorded their account (NULL endpoint_url)
+    that belong to an IAM account this sync just listed but no longer exist in it.
+    Rows that still exist were adopted by the sync's upserts.
+    """
+    accounts = {_arn_account(arn) for arn in synced_arns["users"] | synced_arns["roles"]}
+    for table, column in (("users", "user_arn"), ("roles", "role_arn")):
+        legacy = [r[0] for r in cur.execute(f"SELECT {column} FROM {table} WHERE endpoint_url IS NULL").fetchall()]
+        for arn in legacy:
+            if _arn_account(arn) in accounts and arn not in synced_arns[table]:
+                cur.execute(f"DELETE FROM {table} WHERE {column} = ? AND endpoint_url IS NULL", (arn,))
+
+
+def _role_hash(role_name, create_date, max_duration, principal_json):
+    data = json.dumps([role_name, str(create_date), max_duration, principal_json])
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
 # --- Sync roles & users from AWS ---
-def list_roles_and_users():
-    client = get_iam_client()
+def list_roles_and_users(access_key=None, secret_key=None, endpoint_url=None):
+    """
+    Sync IAM users and roles of one account into SQLite, writing only rows that changed.
+    Rows are scoped to the syncing account; other accounts' rows are left untouched.
+    """
+    client = get_iam_client(access_key, secret_key, endpoint_url)
+    if access_key is None:
+        access_key = session.get("access_key")
+        endpoint_url = session.get("endpoint_url")
+    account = (endpoint_url or "", access_key)
 
     # --- Users ---
     users = []
@@ -59,15 +123,20 @@ def list_roles_and_users():
     for page in paginator.paginate():
         users.extend(page.get("Users", []))
 
-    valid_users = {}
-    conn = sqlite3.connect(DB_FILE)
+    conn = sqlite3.connect(DB_FILE, timeout=30)
     cur = conn.cursor()
-    for u in users:
-        cur.execute("""
-            INSERT OR REPLACE INTO users (user_name, user_arn)
-            VALUES (?, ?)
-        """, (u["UserName"], u["Arn"]))
-        valid_users[u["Arn"]] = u["UserName"]
+    db_users = {arn: name for name, arn in cur.execute(
+        "SELECT user_name, user_arn FROM users WHERE endpoint_url = ? AND access_key = ?", account
+    ).fetchall()}
+    valid_users = {u["Arn"]: u["UserName"] for u in users}
+    for arn, name in valid_users.items():
+        if db_users.get(arn) != name:
+            cur.execute("""
+                INSERT OR REPLACE INTO users (user_name, user_arn, endpoint_url, access_key)
+                VALUES (?, ?, ?, ?)
+            """, (name, arn, *account))
+    for arn in db_users.keys() - valid_users.keys():
+        cur.execute("DELETE FROM users WHERE user_arn = ? AND endpoint_url = ? AND access_key = ?", (arn, *account))
     conn.commit()
 
     # --- Roles ---
@@ -76,7 +145,9 @@ def list_roles_and_users():
     for page in paginator.paginate():
         roles.extend(page.get("Roles", []))
 
-    db_roles = {r[0] for r in cur.execute("SELECT role_arn FROM roles").fetchall()}
+    db_roles = dict(cur.execute(
+        "SELECT role_arn, trust_hash FROM roles WHERE endpoint_url = ? AND access_key = ?", account
+    ).fetchall())
     fetched_roles = set()
 
     for role in roles:
@@ -101,6 +172,11 @@ def list_roles_and_users():
         if not user_list:
             continue
 
+        fetched_roles.add(role_arn)
+        trust_hash = _role_hash(role_name, create_date, max_duration, principal_json)
+        if db_roles.get(role_arn) == trust_hash:
+            continue
+
         # previous permissions
         cur.execute("SELECT assume_permission, assumed_users, assume_history FROM roles WHERE role_arn = ?", (role_arn,))
         row = cur.fetchone()
@@ -118,14 +194,17 @@ def list_roles_and_users():
         assume_perm = {u: assume_perm[u] for u in user_list}
 
         cur.execute("""
-            INSERT INTO roles (role_name, role_arn, create_date, max_session_duration, principal, assume_permission, assumed_users, assume_history)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            INSERT INTO roles (role_name, role_arn, create_date, max_session_duration, principal, assume_permission, assumed_users, assume_history, trust_hash, endpoint_url, access_key)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             ON CONFLICT(role_arn) DO UPDATE SET
                 role_name=excluded.role_name,
                 create_date=excluded.create_date,
                 max_session_duration=excluded.max_session_duration,
                 principal=excluded.principal,
-                assume_permission=excluded.assume_permission
+                assume_permission=excluded.assume_permission,
+                trust_hash=excluded.trust_hash,
+                endpoint_url=excluded.endpoint_url,
+                access_key=excluded.access_key
         """, (
             role_name,
             role_arn,
@@ -134,14 +213,16 @@ def list_roles_and_users():
             principal_json,
             json.dumps(assume_perm),
             json.dumps(prev_assumed),
-            json.dumps(prev_history)
+            json.dumps(prev_history),
+            trust_hash,
+            *account
         ))
-        fetched_roles.add(role_arn)
 
-    # delete removed roles
-    to_delete = db_roles - fetched_roles
+    # delete removed roles of this account
+    to_delete = db_roles.keys() - fetched_roles
     for r in to_delete:
-        cur.execute("DELETE FROM roles WHERE role_arn = ?", (r,))
+        cur.execute("DELETE FROM roles WHERE role_arn = ? AND endpoint_url = ? AND access_key = ?", (r, *account))
+    _drop_legacy_rows(cur, {"users": set(valid_users), "roles": fetched_roles})
 
     conn.commit()
     conn.close()
@@ -174,25 +255,73 @@ def get_roles_and_users():
     conn.close()
     return roles
 
+# --- Background sync worker ---
+def sync_roles_now(access_key, secret_key, endpoint_url):
+    """Run one sync for an account; concurrent syncs are serialized."""
+    with _sync_lock:
+        list_roles_and_users(access_key, secret_key, endpoint_url)
+
+
+def _sync_roles_job(params, credentials, report, cancelled):
+    sync_roles_now(*credentials)
+    return {}
+
+
+register_job_kind("sync_roles", _sync_roles_job)
+
+
+def _sync_registered_accounts():
+    idle_since = time.monotonic() - ROLE_SYNC_IDLE
+    with _sync_accounts_lock:
+        for key in [k for k, (_, last_seen) in _sync_accounts.items() if last_seen < idle_since]:
+            del _sync_accounts[key]
+        accounts = [(key, secret_key) for key, (secret_key, _) in _sync_accounts.items()]
+    for (endpoint_url, access_key), secret_key in accounts:
+        try:
+            sync_roles_now(access_key, secret_key, endpoint_url)
+        except Exception as e:
+            print(f"Failed to sync roles for {access_key}: {e}")
+
+
+def register_sync_account(access_key, secret_key, endpoint_url):
+    """Add a root account to the background sync worker, starting it on first use, and mark it as seen."""
+    global _sync_wake
+    key = (endpoint_url, access_key)
+    with _sync_accounts_lock:
+        is_new = _sync_accounts.get(key, (None,))[0] != secret_key
+        _sync_accounts[key] = (secret_key, time.monotonic())
+        if not is_new:
+            return
+        if _sync_wake is None:
+            _sync_wake = start_periodic_worker("role-sync", ROLE_SYNC_INTERVAL, _sync_registered_accounts)
+        else:
+            _sync_wake.set()
+
+
+def unregister_sync_account(access_key, endpoint_url):
+    """Stop syncing an account in the background and forget its secret, e.g. on logout."""
+    with _sync_accounts_lock:
+        _sync_accounts.pop((endpoint_url, access_key), None)
+
+
 @manage_bp.before_app_request
 def sync_roles_before_request():
-    if session.get("logged_in"):
-        user_info = get_user_type(
-            session["access_key"],
-            session["secret_key"],
-            session["endpoint_url"]
-        )
-        user_arn = user_info.get("Arn", "")
-        
-        if not user_arn:
-            current_app.logger.warning("No user ARN found in session, skipping role sync.")
-            return
+    if request.endpoint == "static" or not session.get("logged_in"):
+        return
+
+    user_info = get_user_type(
+        session["access_key"],
+        session["secret_key"],
+        session["endpoint_url"]
+    )
+    user_arn = user_info.get("Arn", "")
 
-        if user_arn.lower().endswith(":root"):
-            try:
-                list_roles_and_users()
-            except Exception as e:
-                current_app.logger.error(f"Failed to sync roles: {e}")
+    if not user_arn:
+        current_app.logger.warning("No user ARN found in session, skipping role sync.")
+        return
+
+    if user_arn.lower().endswith(":root"):
+        register_sync_account(session["access_key"], session["secret_key"], session["endpoint_url"])
 
 @manage_bp.route("/manage_sts_permissions")
 @login_required
@@ -207,6 +336,22 @@ def manage_sts_permissions():
     return render_template("manage_sts_permissions.html", roles=roles, user_info=user_info)
 
 
+@manage_bp.route("/sync_roles", methods=["POST"])
+@login_required
+def sync_roles_route():
+    user_info = get_user_type(
+        session.get("access_key"),
+        session.get("secret_key"),
+        session.get("endpoint_url")
+    )
+    if not user_info.get("Arn", "").lower().endswith(":root"):
+        return jsonify({"status": "error", "message": "Only the root account can sync roles"}), 403
+
+    # Runs as a background job; repeated clicks share the sync already in flight
+    job_id = submit_job("sync_roles", {}, session["access_key"], session["secret_key"], session["endpoint_url"])
+    return jsonify({"status": "success", "job_id": job_id})
+
+
 @manage_bp.route("/update_permission", methods=["POST"])
 @login_required
 def update_permission_route():
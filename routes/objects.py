@@ -1,23 +1,149 @@
-from flask import Blueprint, render_template, session, jsonify, request, flash, redirect, url_for, send_file, abort
+from flask import Blueprint, render_template, session, jsonify, request, flash, redirect, url_for, abort, Response
 from helpers.auth import login_required
-import boto3
-from io import BytesIO
+from helpers.clients import get_client
 from helpers.aws import get_user_type
+from helpers.jobs import submit_job
+import helpers.bulk_delete  # registers the delete_prefix job kind
+from helpers.bulk_copy import overlaps
+from urllib.parse import quote
+from werkzeug.http import http_date
+from boto3.s3.transfer import TransferConfig
+from cachetools import TTLCache
+import os
+import re
+import math
+import threading
 import botocore.exceptions
 
 
 object_bp = Blueprint("objects", __name__) 
+DOWNLOAD_CHUNK_SIZE = int(os.getenv("DOWNLOAD_CHUNK_SIZE", str(1024 * 1024)))
 
-def get_s3_client():
-    """Return boto3 client configured with current session credentials"""
-    return boto3.client(
+# Direct transfer: the browser talks to the S3 endpoint through presigned URLs
+DIRECT_TRANSFER = os.getenv("DIRECT_TRANSFER", "false").lower() in ("1", "true", "yes")
+PRESIGNED_URL_EXPIRY = int(os.getenv("PRESIGNED_URL_EXPIRY", "3600"))
+DIRECT_MULTIPART_THRESHOLD = int(os.getenv("DIRECT_MULTIPART_THRESHOLD", str(100 * 1024 * 1024)))
+DIRECT_PART_SIZE = int(os.getenv("DIRECT_PART_SIZE", str(64 * 1024 * 1024)))
+MAX_MULTIPART_PARTS = 10000
+
+# Proxied uploads: multipart settings for the panel -> S3 leg
+UPLOAD_MULTIPART_THRESHOLD = int(os.getenv("UPLOAD_MULTIPART_THRESHOLD", str(16 * 1024 * 1024)))
+UPLOAD_PART_SIZE = int(os.getenv("UPLOAD_PART_SIZE", str(16 * 1024 * 1024)))
+UPLOAD_MAX_CONCURRENCY = int(os.getenv("UPLOAD_MAX_CONCURRENCY", "10"))
+
+# Object browser: keys fetched per listing page (S3 caps a page at 1000)
+OBJECT_PAGE_SIZE = int(os.getenv("OBJECT_PAGE_SIZE", "1000"))
+
+# upload_id -> progress of the S3 leg, polled by the objects page
+_upload_progress = TTLCache(maxsize=1024, ttl=3600)
+_upload_progress_lock = threading.Lock()
+
+def get_s3_client(**config_options):
+    """Return pooled boto3 client configured with current session credentials"""
+    return get_client(
         "s3",
         aws_access_key_id=session.get("access_key"),
         aws_secret_access_key=session.get("secret_key"),
         endpoint_url=session.get("endpoint_url"),
-        region_name="default"
+        region_name="default",
+        **config_options
+    )
+
+
+def build_object_key(prefix, folder, filename):
+    """Join prefix, optional folder and file name into an object key; None if the folder is invalid."""
+    if folder and not re.match(r'^[\w\-\./]*$', folder):
+        return None
+
+    key_parts = []
+    if prefix:
+        key_parts.append(prefix.rstrip("/"))
+    if folder:
+        key_parts.append(folder)
+    key_parts.append(filename)
+    return "/".join(key_parts)
+
+
+def get_transfer_config(size):
+    """TransferConfig for an upload of `size` bytes, growing the part size to stay under the part limit."""
+    part_size = max(UPLOAD_PART_SIZE, math.ceil(size / MAX_MULTIPART_PARTS))
+    return TransferConfig(
+        multipart_threshold=UPLOAD_MULTIPART_THRESHOLD,
+        multipart_chunksize=part_size,
+        max_concurrency=UPLOAD_MAX_CONCURRENCY,
+        use_threads=True
     )
 
+
+def _set_upload_progress(upload_id, **fields):
+    if not upload_id:
+        return
+    with _upload_progress_lock:
+        progress = _upload_progress.get(upload_id)
+        if progress is not None:
+            progress.update(fields)
+
+
+def _track_upload_progress(upload_id, total):
+    """Register an upload and return a boto3 transfer callback that records its progress."""
+    if not upload_id:
+        return None
+    with _upload_progress_lock:
+        _upload_progress[upload_id] = {
+            "owner": session.get("access_key"),
+            "bytes": 0,
+            "total": total,
+            "done": False,
+            "error": None
+        }
+
+    def callback(bytes_transferred):
+        with _upload_progress_lock:
+            progress = _upload_progress.get(upload_id)
+            if progress is not None:
+                progress["bytes"] += bytes_transferred
+    return callback
+
+
+def _page_size_arg():
+    try:
+        page_size = int(request.args.get("page_size", OBJECT_PAGE_SIZE))
+    except ValueError:
+        page_size = OBJECT_PAGE_SIZE
+    return min(max(page_size, 1), 1000)
+
+
+def list_objects_page(s3, bucket_name, prefix, token=None, page_size=OBJECT_PAGE_SIZE):
+    """
+    List one page of a prefix with Delimiter="/".
+    Returns (files, folders, next_token); next_token is None on the last page.
+    """
+    params = {"Bucket": bucket_name, "Prefix": prefix, "Delimiter": "/", "MaxKeys": page_size}
+    if token:
+        params["ContinuationToken"] = token
+    response = s3.list_objects_v2(**params)
+
+    folders = []
+    for folder_prefix in response.get("CommonPrefixes", []):
+        folder_name = folder_prefix.get("Prefix", "").rstrip("/").split("/")[-1]
+        if folder_name:
+            folders.append(folder_name)
+
+    files = []
+    for obj in response.get("Contents", []):
+        rest = obj["Key"][len(prefix):] if prefix else obj["Key"]
+        if rest and "/" not in rest:
+            files.append(obj)
+
+    next_token = response.get("NextContinuationToken") if response.get("IsTruncated") else None
+    return files, folders, next_token
+
+
+def _client_error_response(e):
+    error_code = e.response["Error"]["Code"]
+    status = 403 if error_code == "AccessDenied" else 400
+    return jsonify({"success": False, "message": f"❌ {error_code}: {e.response['Error'].get('Message', '')}"}), status
+
 @object_bp.route("/objects", methods=["GET"])
 @login_required
 def all_buckets():
@@ -56,52 +182,59 @@ def list_objects(bucket_name):
     if request.method == "POST" and "file" in request.files:
         file = request.files["file"]
         folder = request.form.get("folder", "").strip().strip("/")
+        upload_id = request.form.get("upload_id", "")
+        if not re.match(r'^[\w\-]{1,64}$', upload_id):
+            upload_id = None
+        back = redirect(url_for("objects.list_objects", bucket_name=bucket_name, prefix=prefix))
 
         if not file.filename:
             flash("❌ File name is empty", "danger")
-            return redirect(url_for("objects.list_objects", bucket_name=bucket_name, prefix=prefix))
+            return jsonify({"success": False}) if upload_id else back
 
-        import re
-        if folder and not re.match(r'^[\w\-\./]*$', folder):
+        key = build_object_key(prefix, folder, file.filename)
+        if key is None:
             flash("❌ Folder name contains invalid characters", "danger")
-            return redirect(url_for("objects.list_objects", bucket_name=bucket_name, prefix=prefix))
+            return jsonify({"success": False}) if upload_id else back
 
-        key_parts = []
-        if prefix:
-            key_parts.append(prefix.rstrip("/"))
-        if folder:
-            key_parts.append(folder)
-        key_parts.append(file.filename)
-        key = "/".join(key_parts)
+        # Werkzeug has already spooled the body to a temporary file; upload it
+        # from there in parallel parts instead of a single stream.
+        stream = file.stream
+        stream.seek(0, os.SEEK_END)
+        size = stream.tell()
+        stream.seek(0)
+        callback = _track_upload_progress(upload_id, size)
 
+        success = False
         try:
-            s3.upload_fileobj(file, bucket_name, key)
+            s3.upload_fileobj(
+                stream, bucket_name, key,
+                ExtraArgs={"ContentType": file.mimetype} if file.mimetype else None,
+                Callback=callback,
+                Config=get_transfer_config(size)
+            )
+            success = True
             flash(f"✅ '{file.filename}' uploaded successfully to '{key}'", "success")
         except botocore.exceptions.ClientError as e:
             error_code = e.response["Error"]["Code"]
-            if error_code == "AccessDenied":
-                abort(403)  
-            else:
-                flash(f"❌ Upload failed: {e.response['Error']['Message']}", "danger")
+            _set_upload_progress(upload_id, error=error_code)
+            if error_code == "AccessDenied" and not upload_id:
+                abort(403)
+            flash(f"❌ Upload failed: {e.response['Error'].get('Message', error_code)}", "danger")
         except Exception as e:
+            _set_upload_progress(upload_id, error=str(e))
             flash(f"❌ Upload failed: {str(e)}", "danger")
+        finally:
+            _set_upload_progress(upload_id, done=True)
 
-        return redirect(url_for("objects.list_objects", bucket_name=bucket_name, prefix=prefix))
+        if upload_id:
+            return jsonify({"success": success, "key": key})
+        return back
 
-    files, folders = [], set()
+    files, folders, next_token = [], [], None
+    token = request.args.get("token") or None
+    page_size = _page_size_arg()
     try:
-        response = s3.list_objects_v2(Bucket=bucket_name, Prefix=prefix, Delimiter="/")
-
-        for folder_prefix in response.get("CommonPrefixes", []):
-            folder_name = folder_prefix.get("Prefix", "").rstrip("/").split("/")[-1]
-            if folder_name:
-                folders.add(folder_name)
-
-        for obj in response.get("Contents", []):
-            key = obj["Key"]
-            rest = key[len(prefix):] if prefix else key
-            if rest and "/" not in rest:
-                files.append(obj)
+        files, folders, next_token = list_objects_page(s3, bucket_name, prefix, token, page_size)
 
     except botocore.exceptions.ClientError as e:
         error_code = e.response["Error"]["Code"]
@@ -114,27 +247,275 @@ def list_objects(bucket_name):
         "objects.html",
         bucket_name=bucket_name,
         files=files,
-        folders=list(folders),
+        folders=folders,
         prefix=prefix,
-        user_info=user_info
+        user_info=user_info,
+        direct_transfer=DIRECT_TRANSFER,
+        token=token,
+        next_token=next_token,
+        page_size=page_size
     )
 
 
+@object_bp.route("/buckets/<bucket_name>/objects/page")
+@login_required
+def list_objects_json(bucket_name):
+    """
+    JSON page of the object browser, used by objects.js for infinite scroll.
+    Query params: prefix, token (continuation token), page_size.
+    """
+    prefix = request.args.get("prefix", "")
+    s3 = get_s3_client()
+    try:
+        files, folders, next_token = list_objects_page(
+            s3, bucket_name, prefix, request.args.get("token") or None, _page_size_arg()
+        )
+    except botocore.exceptions.ClientError as e:
+        return _client_error_response(e)
+    except Exception as e:
+        return jsonify({"success": False, "message": f"❌ Unexpected error: {str(e)}"}), 500
+
+    return jsonify({
+        "success": True,
+        "folders": [{
+            "name": name,
+            "prefix": prefix + name + "/",
+            "url": url_for("objects.list_objects", bucket_name=bucket_name, prefix=prefix + name + "/")
+        } for name in folders],
+        "files": [{
+            "key": obj["Key"],
+            "size": obj.get("Size", 0),
+            "last_modified": obj["LastModified"].strftime("%Y-%m-%d %H:%M:%S") if obj.get("LastModified") else "-",
+            "download_url": url_for("objects.download_object", bucket_name=bucket_name, key=obj["Key"]),
+            "delete_url": url_for("objects.delete_object", bucket_name=bucket_name, key=obj["Key"])
+        } for obj in files],
+        "next_token": next_token
+    })
+
+
+@object_bp.route("/buckets/<bucket_name>/objects/upload_progress/<upload_id>")
+@login_required
+def upload_progress(bucket_name, upload_id):
+    """Return how many bytes of a proxied upload have been sent to S3."""
+    with _upload_progress_lock:
+        progress = dict(_upload_progress.get(upload_id) or {})
+    if not progress or progress.pop("owner") != session.get("access_key"):
+        return jsonify({"success": False, "message": "❌ Unknown upload."}), 404
+    return jsonify({"success": True, **progress})
+
+
 @object_bp.route("/buckets/<bucket_name>/objects/download/<path:key>")
 @login_required
 def download_object(bucket_name, key):
+    """
+    Stream an object to the client chunk by chunk.
+
+    Range, If-Range and If-None-Match are forwarded to S3 so browsers and
+    `curl -C` can resume downloads; the object is never buffered in memory.
+    """
+    if DIRECT_TRANSFER:
+        s3 = get_s3_client(signature_version="s3v4")
+        url = s3.generate_presigned_url(
+            "get_object",
+            Params={
+                "Bucket": bucket_name,
+                "Key": key,
+                "ResponseContentDisposition": f"attachment; filename*=UTF-8''{quote(key.split('/')[-1])}"
+            },
+            ExpiresIn=PRESIGNED_URL_EXPIRY
+        )
+        return redirect(url)
+
     s3 = get_s3_client()
+    params = {"Bucket": bucket_name, "Key": key}
+    range_header = request.headers.get("Range")
+    if_range = request.headers.get("If-Range")
+    if_none_match = request.headers.get("If-None-Match")
+    if range_header:
+        params["Range"] = range_header
+        # Only ETag validators can be checked by S3; date validators fall back to a full download
+        if if_range and if_range.startswith(("\"", "W/")):
+            params["IfMatch"] = if_range
+        elif if_range:
+            params.pop("Range")
+    if if_none_match:
+        params["IfNoneMatch"] = if_none_match
+
     try:
-        obj = s3.get_object(Bucket=bucket_name, Key=key)
-        return send_file(
-            BytesIO(obj["Body"].read()),
-            download_name=key.split("/")[-1],
-            as_attachment=True
-        )
+        try:
+            obj = s3.get_object(**params)
+        except botocore.exceptions.ClientError as e:
+            # If-Range mismatch: the object changed, so send it in full
+            if "IfMatch" in params and e.response["Error"]["Code"] in ("PreconditionFailed", "412"):
+                params.pop("IfMatch")
+                params.pop("Range")
+                obj = s3.get_object(**params)
+            else:
+                raise
+    except botocore.exceptions.ClientError as e:
+        error_code = e.response["Error"]["Code"]
+        if error_code in ("NotModified", "304"):
+            return Response(status=304, headers={"ETag": if_none_match})
+        if error_code in ("InvalidRange", "416"):
+            return Response(status=416)
+        if error_code == "AccessDenied":
+            abort(403)
+        flash(f"Download failed: {e.response['Error'].get('Message', error_code)}", "danger")
+        return redirect(url_for("objects.list_objects", bucket_name=bucket_name))
     except Exception as e:
         flash(f"Download failed: {str(e)}", "danger")
         return redirect(url_for("objects.list_objects", bucket_name=bucket_name))
 
+    body = obj["Body"]
+
+    def generate():
+        try:
+            for chunk in body.iter_chunks(DOWNLOAD_CHUNK_SIZE):
+                yield chunk
+        finally:
+            body.close()
+
+    filename = key.split("/")[-1]
+    ascii_name = filename.encode("ascii", "ignore").decode().replace('"', "") or "download"
+    headers = {
+        "Content-Length": str(obj["ContentLength"]),
+        "Accept-Ranges": "bytes",
+        "Content-Disposition": f"attachment; filename=\"{ascii_name}\"; filename*=UTF-8''{quote(filename)}"
+    }
+    if obj.get("ETag"):
+        headers["ETag"] = obj["ETag"]
+    if obj.get("LastModified"):
+        headers["Last-Modified"] = http_date(obj["LastModified"])
+
+    status = 200
+    if obj.get("ContentRange"):
+        headers["Content-Range"] = obj["ContentRange"]
+        status = 206
+
+    return Response(
+        generate(),
+        status=status,
+        headers=headers,
+        mimetype=obj.get("ContentType") or "application/octet-stream",
+        direct_passthrough=True
+    )
+
+@object_bp.route("/buckets/<bucket_name>/objects/presign_upload", methods=["POST"])
+@login_required
+def presign_upload(bucket_name):
+    """
+    Issue presigned URLs so the browser uploads straight to the S3 endpoint.
+    Expects JSON: { "filename", "size", "content_type", "prefix", "folder" }
+    Small files get one PUT URL; larger ones get a multipart upload with one URL per part.
+    """
+    if not DIRECT_TRANSFER:
+        return jsonify({"success": False, "message": "❌ Direct transfer is disabled."}), 400
+
+    data = request.get_json(silent=True) or {}
+    filename = data.get("filename")
+    try:
+        size = int(data.get("size", 0))
+    except (TypeError, ValueError):
+        size = -1
+    if not filename or size < 0:
+        return jsonify({"success": False, "message": "❌ filename and size are required."}), 400
+
+    key = build_object_key(data.get("prefix", "").strip(), data.get("folder", "").strip().strip("/"), filename)
+    if key is None:
+        return jsonify({"success": False, "message": "❌ Folder name contains invalid characters"}), 400
+    content_type = data.get("content_type") or "application/octet-stream"
+
+    s3 = get_s3_client(signature_version="s3v4")
+    try:
+        if size < DIRECT_MULTIPART_THRESHOLD:
+            url = s3.generate_presigned_url(
+                "put_object",
+                Params={"Bucket": bucket_name, "Key": key, "ContentType": content_type},
+                ExpiresIn=PRESIGNED_URL_EXPIRY
+            )
+            return jsonify({"success": True, "mode": "single", "key": key, "url": url, "content_type": content_type})
+
+        part_size = max(DIRECT_PART_SIZE, math.ceil(size / MAX_MULTIPART_PARTS))
+        upload = s3.create_multipart_upload(Bucket=bucket_name, Key=key, ContentType=content_type)
+        upload_id = upload["UploadId"]
+        parts = []
+        for part_number in range(1, math.ceil(size / part_size) + 1):
+            parts.append({
+                "PartNumber": part_number,
+                "url": s3.generate_presigned_url(
+                    "upload_part",
+                    Params={"Bucket": bucket_name, "Key": key, "UploadId": upload_id, "PartNumber": part_number},
+                    ExpiresIn=PRESIGNED_URL_EXPIRY
+                )
+            })
+        return jsonify({
+            "success": True,
+            "mode": "multipart",
+            "key": key,
+            "upload_id": upload_id,
+            "part_size": part_size,
+            "parts": parts
+        })
+    except botocore.exceptions.ClientError as e:
+        return _client_error_response(e)
+    except Exception as e:
+        return jsonify({"success": False, "message": f"❌ Unexpected error: {str(e)}"}), 500
+
+
+@object_bp.route("/buckets/<bucket_name>/objects/complete_upload", methods=["POST"])
+@login_required
+def complete_upload(bucket_name):
+    """
+    Complete a direct multipart upload.
+    Expects JSON: { "key", "upload_id", "parts": [{ "PartNumber", "ETag" }] }
+    """
+    data = request.get_json(silent=True) or {}
+    key = data.get("key")
+    upload_id = data.get("upload_id")
+    parts = data.get("parts") or []
+    if not key or not upload_id or not parts:
+        return jsonify({"success": False, "message": "❌ key, upload_id and parts are required."}), 400
+
+    s3 = get_s3_client()
+    try:
+        s3.complete_multipart_upload(
+            Bucket=bucket_name,
+            Key=key,
+            UploadId=upload_id,
+            MultipartUpload={"Parts": sorted(
+                ({"PartNumber": int(p["PartNumber"]), "ETag": p["ETag"]} for p in parts),
+                key=lambda p: p["PartNumber"]
+            )}
+        )
+        flash(f"✅ '{key.split('/')[-1]}' uploaded successfully to '{key}'", "success")
+        return jsonify({"success": True, "key": key})
+    except botocore.exceptions.ClientError as e:
+        return _client_error_response(e)
+    except Exception as e:
+        return jsonify({"success": False, "message": f"❌ Unexpected error: {str(e)}"}), 500
+
+
+@object_bp.route("/buckets/<bucket_name>/objects/abort_upload", methods=["POST"])
+@login_required
+def abort_upload(bucket_name):
+    """
+    Abort a direct multipart upload so its parts do not linger on the cluster.
+    Expects JSON: { "key", "upload_id" }
+    """
+    data = request.get_json(silent=True) or {}
+    key = data.get("key")
+    upload_id = data.get("upload_id")
+    if not key or not upload_id:
+        return jsonify({"success": False, "message": "❌ key and upload_id are required."}), 400
+
+    s3 = get_s3_client()
+    try:
+        s3.abort_multipart_upload(Bucket=bucket_name, Key=key, UploadId=upload_id)
+        return jsonify({"success": True})
+    except botocore.exceptions.ClientError as e:
+        return _client_error_response(e)
+
+
 @object_bp.route("/buckets/<bucket_name>/objects/delete/<path:key>", methods=["POST"])
 @login_required
 def delete_object(bucket_name, key):
@@ -147,6 +528,82 @@ def delete_object(bucket_name, key):
         flash(f"❌ Delete failed: {str(e)}", "danger")
     return redirect(url_for("objects.list_objects", bucket_name=bucket_name, prefix=prefix))
 
+@object_bp.route("/buckets/<bucket_name>/objects/delete_prefix", methods=["POST"])
+@login_required
+def delete_prefix_route(bucket_name):
+    """
+    Start a background job deleting everything under a prefix; an empty prefix empties the bucket.
+    Expects JSON: { "prefix": "logs/2023/" }. Progress is served by the jobs blueprint.
+    """
+    data = request.get_json(silent=True) or {}
+    prefix = data.get("prefix", "")
+    if prefix and not prefix.endswith("/"):
+        prefix += "/"
+
+    s3 = get_s3_client()
+    try:
+        # Fail fast on a missing bucket or missing permissions
+        s3.head_bucket(Bucket=bucket_name)
+    except botocore.exceptions.ClientError as e:
+        return _client_error_response(e)
+
+    job_id = submit_job(
+        "delete_prefix",
+        {"bucket": bucket_name, "prefix": prefix},
+        session["access_key"], session["secret_key"], session["endpoint_url"]
+    )
+    return jsonify({"success": True, "job_id": job_id})
+
+
+@object_bp.route("/buckets/<bucket_name>/objects/copy", methods=["POST"])
+@login_required
+def copy_objects_route(bucket_name):
+    """
+    Start a background job copying (or moving) objects server-side.
+    Expects JSON: { "prefix": "data/", "key": optional single key, "dest_bucket", "dest_prefix", "move": false }
+    Without a key everything under the prefix is copied, keeping paths relative to it.
+    """
+    data = request.get_json(silent=True) or {}
+    key = data.get("key") or None
+    dest_bucket = (data.get("dest_bucket") or bucket_name).strip()
+    dest_prefix = (data.get("dest_prefix") or "").strip().lstrip("/")
+    if dest_prefix and not dest_prefix.endswith("/"):
+        dest_prefix += "/"
+
+    if key:
+        source_prefix = key[:key.rfind("/") + 1]
+        if dest_bucket == bucket_name and dest_prefix == source_prefix:
+            return jsonify({"success": False, "message": "❌ Source and destination are the same."}), 400
+    else:
+        source_prefix = data.get("prefix", "")
+        if source_prefix and not source_prefix.endswith("/"):
+            source_prefix += "/"
+        if overlaps(bucket_name, source_prefix, dest_bucket, dest_prefix):
+            return jsonify({"success": False, "message": "❌ The destination cannot be inside the source folder."}), 400
+
+    s3 = get_s3_client()
+    try:
+        s3.head_bucket(Bucket=bucket_name)
+        if dest_bucket != bucket_name:
+            s3.head_bucket(Bucket=dest_bucket)
+    except botocore.exceptions.ClientError as e:
+        return _client_error_response(e)
+
+    job_id = submit_job(
+        "copy_prefix",
+        {
+            "source_bucket": bucket_name,
+            "source_prefix": source_prefix,
+            "keys": [key] if key else None,
+            "dest_bucket": dest_bucket,
+            "dest_prefix": dest_prefix,
+            "move": bool(data.get("move"))
+        },
+        session["access_key"], session["secret_key"], session["endpoint_url"]
+    )
+    return jsonify({"success": True, "job_id": job_id})
+
+
 @object_bp.route("/buckets/<bucket_name>/objects/folders/<path:folder>")
 @login_required
 def view_folder(bucket_name, folder):
@@ -1,12 +1,24 @@
-from flask import Blueprint, render_template, request, jsonify, session
+from flask import Blueprint, render_template, request, jsonify, session, Response, stream_with_context
 from helpers.auth import login_required
 from helpers.aws import get_user_type
-import boto3
+from helpers.clients import get_client
+from helpers import s3_select, select_cache
+from cachetools import TTLCache
+import os
+import json
+import threading
 
 s3_select_bp = Blueprint("s3_select", __name__)
 
+OBJECT_LIST_CACHE_TTL = int(os.getenv("OBJECT_LIST_CACHE_TTL", "30"))
+OBJECT_LIST_PAGE_SIZE = 100
+
+# (endpoint, access_key, bucket, prefix, delimiter, token, limit) -> listing page
+_listing_cache = TTLCache(maxsize=2048, ttl=OBJECT_LIST_CACHE_TTL)
+_listing_lock = threading.Lock()
+
 def get_s3_client():
-    return boto3.client(
+    return get_client(
         "s3",
         aws_access_key_id=session.get("access_key"),
         aws_secret_access_key=session.get("secret_key"),
@@ -38,58 +50,130 @@ def list_buckets():
 @s3_select_bp.route("/list-objects")
 @login_required
 def list_objects():
+    """
+    One page of keys for the object picker.
+
+    Query params: bucket, prefix (what the user typed), delimiter, token
+    (continuation token from the previous page) and limit. Returns
+    {"keys", "prefixes", "next_token"}; pages are cached for a few seconds
+    so typing does not trigger a fresh listing on every keystroke.
+    """
     bucket = request.args.get("bucket")
     if not bucket:
         return jsonify({"error": "Bucket parameter is required"}), 400
 
+    prefix = request.args.get("prefix", "")
+    delimiter = request.args.get("delimiter", "")
+    token = request.args.get("token") or None
+    try:
+        limit = min(max(int(request.args.get("limit", OBJECT_LIST_PAGE_SIZE)), 1), 1000)
+    except ValueError:
+        limit = OBJECT_LIST_PAGE_SIZE
+
+    cache_key = (session.get("endpoint_url"), session.get("access_key"), bucket, prefix, delimiter, token, limit)
+    with _listing_lock:
+        page = _listing_cache.get(cache_key)
+    if page is not None:
+        return jsonify(page)
+
+    params = {"Bucket": bucket, "Prefix": prefix, "MaxKeys": limit}
+    if delimiter:
+        params["Delimiter"] = delimiter
+    if token:
+        params["ContinuationToken"] = token
+
     s3 = get_s3_client()
     try:
-        response = s3.list_objects_v2(Bucket=bucket)
-        objects = [o["Key"] for o in response.get("Contents", [])]
-        return jsonify(objects)
+        response = s3.list_objects_v2(**params)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+    page = {
+        "keys": [o["Key"] for o in response.get("Contents", []) if not o["Key"].endswith("/")],
+        "prefixes": [p["Prefix"] for p in response.get("CommonPrefixes", [])],
+        "next_token": response.get("NextContinuationToken") if response.get("IsTruncated") else None
+    }
+    with _listing_lock:
+        _listing_cache[cache_key] = page
+    return jsonify(page)
+
+def _ndjson(events):
+    for event in events:
+        yield json.dumps(event) + "\n"
+
+
+def _stream_events(events):
+    return Response(
+        stream_with_context(_ndjson(events)),
+        mimetype="application/x-ndjson",
+        headers={"X-Accel-Buffering": "no", "Cache-Control": "no-cache"}
+    )
+
+
 @s3_select_bp.route("/run-query", methods=["POST"])
 @login_required
 def run_query():
+    """
+    Run an S3 Select query and stream its events as NDJSON.
+
+    Expects JSON: { "bucket", "key", "expression", "delimiter", "input_format",
+    "compression", "header", "parallel" }. With "parallel", large splittable
+    objects are queried in ScanRange slices on several connections at once.
+    With "mode": "prefix", the query runs over every object under "prefix".
+    """
     data = request.json
     bucket = data.get("bucket")
     key = data.get("key")
     expression = data.get("expression")
-    delimiter = data.get("delimiter", ",")
+    delimiter = data.get("delimiter") or ","
+    prefix_mode = data.get("mode") == "prefix"
 
-    if not bucket or not key or not expression:
+    if not bucket or not expression or not (key or prefix_mode):
         return "Error: bucket, key, and expression are required!", 400
 
+    try:
+        input_serialization = s3_select.build_input_serialization(
+            data.get("input_format"), data.get("compression"), delimiter, data.get("header")
+        )
+    except ValueError as e:
+        return f"Error: {str(e)}", 400
+    output_serialization = s3_select.build_output_serialization(delimiter)
+
     s3 = get_s3_client()
+    if prefix_mode:
+        try:
+            keys, truncated = s3_select.list_prefix_keys(s3, bucket, data.get("prefix", ""))
+        except Exception as e:
+            return f"Error: {str(e)}", 500
+        if not keys:
+            return "Error: no objects found under this prefix!", 404
+        return _stream_events(s3_select.query_prefix(
+            s3, bucket, keys, expression, input_serialization, output_serialization, truncated=truncated
+        ))
+
     try:
-        response = s3.select_object_content(
-            Bucket=bucket,
-            Key=key,
-            Expression=expression,
-            ExpressionType="SQL",
-            InputSerialization={
-                "CSV": {
-                    "FileHeaderInfo": "USE",
-                    "RecordDelimiter": "\n",
-                    "FieldDelimiter": delimiter
-                },
-                "CompressionType": "NONE"
-            },
-            OutputSerialization={
-                "CSV": {
-                    "RecordDelimiter": "\n",
-                    "FieldDelimiter": delimiter
-                }
-            }
+        head = s3.head_object(Bucket=bucket, Key=key)
+        digest = select_cache.cache_key(
+            session.get("endpoint_url"), bucket, key, head.get("ETag"),
+            expression, input_serialization, output_serialization
         )
+        cached = select_cache.get(digest)
+        if cached is not None:
+            return _stream_events(select_cache.replay(cached))
 
-        output = ""
-        for event in response["Payload"]:
-            if "Records" in event:
-                output += event["Records"]["Payload"].decode("utf-8")
+        if data.get("parallel") and s3_select.can_split(input_serialization, expression):
+            ranges = s3_select.scan_ranges(head["ContentLength"])
+            if len(ranges) > 1:
+                jobs = [
+                    lambda r=r: s3_select.select_events(s3_select.start_select(
+                        s3, bucket, key, expression, input_serialization, output_serialization, scan_range=r
+                    ))
+                    for r in ranges
+                ]
+                return _stream_events(select_cache.record(digest, s3_select.run_parallel(jobs)))
 
-        return output
+        payload = s3_select.start_select(s3, bucket, key, expression, input_serialization, output_serialization)
     except Exception as e:
         return f"Error: {str(e)}", 500
+
+    return _stream_events(select_cache.record(digest, s3_select.select_events(payload)))
@@ -1,7 +1,9 @@
 from flask import Blueprint, render_template, session, jsonify, request, flash, redirect, url_for
 from helpers.auth import login_required
-from helpers.aws import get_user_type, list_iam_users, create_iam_user, list_access_keys, create_access_key, delete_iam_user, disable_access_key, delete_access_key
-import boto3, json
+from helpers.aws import get_user_type, create_iam_user, list_access_keys, create_access_key, delete_iam_user, disable_access_key, delete_access_key
+from helpers.iam import get_enriched_users, invalidate_iam_cache
+import json
+from helpers.clients import get_client
 from botocore.exceptions import ClientError
 
 
@@ -15,51 +17,24 @@ def profile():
     return render_template("profile.html", user_info=user_info, show_alert=show_alert)
 
 
+@user_bp.after_request
+def invalidate_users_cache(response):
+    """Any user, key or policy change may alter the cached IAM listings."""
+    if request.method == "POST" and session.get("access_key"):
+        invalidate_iam_cache(session["access_key"], session.get("endpoint_url"))
+    return response
+
+
 @user_bp.route("/iam_users")
 @login_required
 def iam_users():
     user_info = get_user_type(session["access_key"], session["secret_key"], session["endpoint_url"])
-    iam_users_list = list_iam_users(session["access_key"], session["secret_key"], session["endpoint_url"])
-
-    enriched_users = []
-    for u in iam_users_list:
-        username = u.get("UserName")
-        active_count = None
-        active_error = None
-
-        try:
-            keys_resp = list_access_keys(session["access_key"], session["secret_key"], session["endpoint_url"], username)
-            if isinstance(keys_resp, dict) and keys_resp.get("success") is not None:
-                if keys_resp.get("success"):
-                    keys = keys_resp.get("keys", [])
-                    active_count = sum(1 for k in keys if k.get("Status") == "Active")
-                else:
-                    active_error = keys_resp.get("message") or "Error"
-            else:
-                keys = keys_resp or []
-                active_count = sum(1 for k in keys if k.get("Status") == "Active")
-        except Exception as e:
-            active_error = str(e)
-
-        user_copy = u.copy()
-        user_copy["ActiveKeysCount"] = active_count
-        user_copy["ActiveKeysError"] = active_error
-        
-        try:
-            iam = boto3.client(
-                "iam",
-                aws_access_key_id=session["access_key"],
-                aws_secret_access_key=session["secret_key"],
-                endpoint_url=session["endpoint_url"],
-                region_name="default"
-            )
-            groups_response = iam.list_groups_for_user(UserName=username)
-            user_copy["Groups"] = [g['GroupName'] for g in groups_response['Groups']]
-        except Exception as e:
-            user_copy["Groups"] = []
-        
-        enriched_users.append(user_copy)
-
+    enriched_users = get_enriched_users(
+        session["access_key"],
+        session["secret_key"],
+        session["endpoint_url"],
+        refresh=request.args.get("refresh") == "1"
+    )
     return render_template("iam_users.html", user_info=user_info, iam_users=enriched_users)
 
 @user_bp.route("/create_user", methods=["POST"])
@@ -89,7 +64,7 @@ def create_user():
 
 def attach_getuser_policy(root_access_key, root_secret_key, endpoint_url, target_username, region_name=""):
     try:
-        iam = boto3.client(
+        iam = get_client(
             "iam",
             aws_access_key_id=root_access_key,
             aws_secret_access_key=root_secret_key,
@@ -162,9 +137,7 @@ def delete_key(username):
 @login_required
 def get_keys():
     username = request.form.get("username")
-    import boto3
-
-    iam = boto3.client(
+    iam = get_client(
         "iam",
         aws_access_key_id=session["access_key"],
         aws_secret_access_key=session["secret_key"],
@@ -188,7 +161,7 @@ def modify_key():
     key_id = request.form.get("key_id")
     action = request.form.get("action")
 
-    iam = boto3.client(
+    iam = get_client(
         "iam",
         aws_access_key_id=session["access_key"],
         aws_secret_access_key=session["secret_key"],
@@ -249,7 +222,7 @@ def delete_user():
 @login_required
 def get_user_inline_policies():
     username = request.args.get("username")
-    iam_client = boto3.client(
+    iam_client = get_client(
         "iam",
         aws_access_key_id=session["access_key"],
         aws_secret_access_key=session["secret_key"],
@@ -275,7 +248,7 @@ def delete_user_inline_policy():
     data = request.get_json()
     username = data.get("username")
     policy_name = data.get("policy_name")
-    iam_client = boto3.client(
+    iam_client = get_client(
         "iam",
         aws_access_key_id=session["access_key"],
         aws_secret_access_key=session["secret_key"],
@@ -296,7 +269,7 @@ def add_user_inline_policy():
     policy_name = data.get("policy_name")
     policy_document = data.get("policy_document")
 
-    iam_client = boto3.client(
+    iam_client = get_client(
         "iam",
         aws_access_key_id=session["access_key"],
         aws_secret_access_key=session["secret_key"],
@@ -321,7 +294,7 @@ def update_user_inline_policy():
     username = data.get("username")
     policy_name = data.get("policy_name")
     policy_document = data.get("policy_document")
-    iam_client = boto3.client(
+    iam_client = get_client(
         "iam",
         aws_access_key_id=session["access_key"],
         aws_secret_access_key=session["secret_key"],
@@ -342,7 +315,7 @@ def update_user_inline_policy():
 @login_required
 def get_attached_user_policies():
     username = request.args.get("username")
-    iam_client = boto3.client(
+    iam_client = get_client(
         "iam",
         aws_access_key_id=session["access_key"],
         aws_secret_access_key=session["secret_key"],
@@ -362,7 +335,7 @@ def attach_user_policy():
     username = data.get("username")
     policy_arn = data.get("policy_arn")
 
-    iam_client = boto3.client(
+    iam_client = get_client(
         "iam",
         aws_access_key_id=session["access_key"],
         aws_secret_access_key=session["secret_key"],
@@ -382,7 +355,7 @@ def detach_user_policy():
     username = data.get("username")
     policy_arn = data.get("policy_arn")
 
-    iam_client = boto3.client(
+    iam_client = get_client(
         "iam",
         aws_access_key_id=session["access_key"],
         aws_secret_access_key=session["secret_key"],
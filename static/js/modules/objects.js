@@ -26,6 +26,17 @@
             $rows.hide();
             filteredRows.slice(start, end).show();
             renderPagination(filteredRows);
+
+            // Reached the last loaded page: fetch the next listing page in the background
+            const totalPages = Math.max(1, Math.ceil(filteredRows.length / rowsPerPage));
+            if(currentPage === totalPages && !$("#searchInput").val()) loadNextPage();
+        }
+
+        // Rows matching the active search, or every row when there is none
+        function currentRows(){
+            const val = $("#searchInput").val();
+            if(!val || !val.length) return $rows;
+            return $rows.filter(function(){ return $(this).text().toLowerCase().indexOf(val.toLowerCase()) > -1; });
         }
 
         function renderPagination(filteredRows){
@@ -54,26 +65,85 @@
             nextLi.append(nextA); $pagination.append(nextLi);
         }
 
+        // -------------------------
+        // Cursor pagination: append further listing pages as the user pages through
+        // -------------------------
+        let nextToken = $table.data("next-token") || null;
+        let loadingPage = false;
+
+        function objectRow(file){
+            const $tr = $('<tr class="file-row"></tr>');
+            $tr.append($("<td></td>").append('<i class="fas fa-file file-icon"></i> ').append(document.createTextNode(file.key)));
+            $tr.append($("<td></td>").text(file.size));
+            $tr.append($("<td></td>").text(file.last_modified));
+            const $actions = $("<td></td>");
+            $actions.append($('<a class="btn btn-sm btn-success" title="Download"><i class="fas fa-download"></i></a>').attr("href", file.download_url));
+            $actions.append(" ").append($('<button type="button" class="btn btn-sm btn-primary copyBtn" title="Copy / move"><i class="fas fa-copy"></i></button>').attr("data-key", file.key));
+            const $form = $('<form method="POST" style="display:inline;" class="delete-form"></form>')
+                .attr("action", file.delete_url)
+                .attr("data-key", file.key)
+                .attr("data-prefix", $table.data("prefix"));
+            $form.append(' <button type="button" class="btn btn-sm btn-danger deleteBtn" title="Delete"><i class="fas fa-trash"></i></button>');
+            $actions.append(" ").append($form);
+            return $tr.append($actions);
+        }
+
+        function folderRow(folder){
+            const $tr = $('<tr class="folder-row"></tr>');
+            $tr.append($("<td></td>").append('<i class="fas fa-folder folder-icon"></i> ').append($("<a></a>").attr("href", folder.url).text(folder.name)));
+            const $copy = $('<button type="button" class="btn btn-sm btn-primary copyBtn" title="Copy / move folder"><i class="fas fa-copy"></i></button>').attr("data-prefix", folder.prefix);
+            const $delete = $('<button type="button" class="btn btn-sm btn-danger deletePrefixBtn" title="Delete folder"><i class="fas fa-trash"></i></button>').attr("data-prefix", folder.prefix);
+            return $tr.append("<td>-</td><td>-</td>").append($("<td></td>").append($copy).append(" ").append($delete));
+        }
+
+        function loadNextPage(){
+            if(!nextToken || loadingPage) return;
+            loadingPage = true;
+            $("#loadMoreBtn").addClass("disabled");
+            $.getJSON($table.data("page-url"), {
+                prefix: $table.data("prefix"),
+                token: nextToken,
+                page_size: $table.data("page-size")
+            }).done(function(page){
+                const $tbody = $table.find("tbody");
+                page.folders.forEach(function(folder){ $tbody.append(folderRow(folder)); });
+                page.files.forEach(function(file){ $tbody.append(objectRow(file)); });
+                nextToken = page.next_token;
+                $rows = $table.find("tbody tr");
+                if(!nextToken) $("#loadMoreBtn").remove();
+                loadingPage = false;
+                // Hide the appended rows again and keep the current page and search
+                renderTable(currentRows());
+            }).fail(function(){
+                loadingPage = false;
+            }).always(function(){
+                $("#loadMoreBtn").removeClass("disabled");
+            });
+        }
+
+        $("#loadMoreBtn").click(function(e){
+            e.preventDefault();
+            loadNextPage();
+        });
+
+        $("#pageSizeSelect").change(function(){
+            const url = new URL(window.location.href);
+            url.searchParams.set("page_size", $(this).val());
+            url.searchParams.delete("token");
+            window.location.href = url.toString();
+        });
+
         renderTable($rows);
 
         $rowsPerPageSelect.change(function(){
             rowsPerPage = parseInt($(this).val());
             currentPage = 1;
-            // if a search/filter is active, use filtered rows
-            const val = $("#searchInput").val();
-            if(val && val.length){
-                const $filteredRows = $rows.filter(function(){ return $(this).text().toLowerCase().indexOf(val.toLowerCase()) > -1; });
-                renderTable($filteredRows);
-            } else {
-                renderTable($rows);
-            }
+            renderTable(currentRows());
         });
 
         $("#searchInput").on("keyup", function(){
-            const val = $(this).val().toLowerCase();
-            const $filteredRows = $rows.filter(function(){ return $(this).text().toLowerCase().indexOf(val) > -1; });
             currentPage = 1;
-            renderTable($filteredRows);
+            renderTable(currentRows());
         });
 
         // -------------------------
@@ -157,22 +227,246 @@
         });
 
         $("#confirmUploadBtn").click(function(){
-            $("#uploadForm").submit();
+            const $form = $("#uploadForm");
+            $("#uploadConfirmModal").modal("hide");
+            if($form.data("direct-transfer") === true){
+                directUpload($form);
+            } else {
+                proxiedUpload($form);
+            }
         });
 
+        // -------------------------
+        // Proxied upload with progress: browser -> panel, then panel -> S3
+        // -------------------------
+        function proxiedUpload($form){
+            const file = $("#fileInput")[0].files[0];
+            const uploadId = Date.now().toString(36) + Math.random().toString(36).slice(2, 10);
+            const formData = new FormData($form[0]);
+            formData.append("upload_id", uploadId);
+            let poll = null;
+
+            $("#uploadBtn").prop("disabled", true);
+            $("#uploadProgress").removeClass("d-none");
+            setUploadProgress(0, file.size * 2);
+
+            const xhr = new XMLHttpRequest();
+            xhr.open("POST", $form.attr("action"));
+            xhr.upload.onprogress = function(e){ if(e.lengthComputable) setUploadProgress(e.loaded, e.total * 2); };
+            xhr.upload.onload = function(){
+                // Body received by the panel; follow its transfer to S3
+                const url = $form.data("progress-url").replace("__id__", uploadId);
+                poll = setInterval(function(){
+                    $.getJSON(url).done(function(p){
+                        if(p.success) setUploadProgress(p.total + p.bytes, p.total * 2);
+                    });
+                }, 1000);
+            };
+            xhr.onloadend = function(){
+                if(poll) clearInterval(poll);
+                window.location.reload();
+            };
+            xhr.send(formData);
+        }
+
+        // -------------------------
+        // Direct upload through presigned URLs
+        // -------------------------
+        function showUploadError(message){
+            $("#uploadProgress").addClass("d-none");
+            $("#customAlert").text(message).removeClass("d-none").addClass("show");
+        }
+
+        function setUploadProgress(loaded, total){
+            const percent = total ? Math.floor(loaded * 100 / total) : 100;
+            $("#uploadProgress .progress-bar").css("width", percent + "%").text(percent + "%");
+        }
+
+        function postJSON(url, payload){
+            return $.ajax({ url: url, method: "POST", contentType: "application/json", data: JSON.stringify(payload) });
+        }
+
+        function putBlob(url, blob, contentType, onProgress){
+            return new Promise(function(resolve, reject){
+                const xhr = new XMLHttpRequest();
+                xhr.open("PUT", url);
+                if(contentType) xhr.setRequestHeader("Content-Type", contentType);
+                xhr.upload.onprogress = function(e){ if(e.lengthComputable) onProgress(e.loaded); };
+                xhr.onload = function(){
+                    if(xhr.status >= 200 && xhr.status < 300) resolve(xhr.getResponseHeader("ETag"));
+                    else reject(new Error("Upload failed with status " + xhr.status));
+                };
+                xhr.onerror = function(){ reject(new Error("Network error (check the bucket CORS configuration)")); };
+                xhr.send(blob);
+            });
+        }
+
+        async function directUpload($form){
+            const file = $("#fileInput")[0].files[0];
+            const contentType = file.type || "application/octet-stream";
+            let plan;
+
+            $("#uploadBtn").prop("disabled", true);
+            $("#uploadProgress").removeClass("d-none");
+            setUploadProgress(0, file.size);
+
+            try {
+                plan = await postJSON($form.data("presign-url"), {
+                    filename: file.name,
+                    size: file.size,
+                    content_type: contentType,
+                    prefix: $form.find('input[name="prefix"]').val(),
+                    folder: $form.find('input[name="folder"]').val()
+                });
+
+                if(plan.mode === "single"){
+                    await putBlob(plan.url, file, plan.content_type, function(loaded){ setUploadProgress(loaded, file.size); });
+                    window.location.reload();
+                    return;
+                }
+
+                const uploaded = [];
+                let done = 0;
+                for(const part of plan.parts){
+                    const start = (part.PartNumber - 1) * plan.part_size;
+                    const blob = file.slice(start, Math.min(start + plan.part_size, file.size));
+                    const etag = await putBlob(part.url, blob, null, function(loaded){ setUploadProgress(done + loaded, file.size); });
+                    if(!etag) throw new Error("ETag header not readable (expose ETag in the bucket CORS configuration)");
+                    done += blob.size;
+                    uploaded.push({ PartNumber: part.PartNumber, ETag: etag });
+                }
+
+                await postJSON($form.data("complete-url"), { key: plan.key, upload_id: plan.upload_id, parts: uploaded });
+                window.location.reload();
+            } catch(err){
+                if(plan && plan.upload_id){
+                    postJSON($form.data("abort-url"), { key: plan.key, upload_id: plan.upload_id });
+                }
+                const message = (err.responseJSON && err.responseJSON.message) || err.message || "Upload failed";
+                showUploadError(message);
+                $("#uploadBtn").prop("disabled", false);
+            }
+        }
+
         // -------------------------
         // Delete modal logic
         // -------------------------
         let deleteForm = null;
-        $(".deleteBtn").on("click", function(){
+        let deletePrefix = null;
+        $("#objectTable").on("click", ".deleteBtn", function(){
             deleteForm = $(this).closest(".delete-form");
+            deletePrefix = null;
             $("#deleteFileName").text(deleteForm.data("key"));
             $("#deleteFilePath").text(deleteForm.data("prefix") || "/");
             $("#deleteModal").modal("show");
         });
 
+        $(document).on("click", ".deletePrefixBtn", function(){
+            deleteForm = null;
+            deletePrefix = $(this).attr("data-prefix") || "";
+            $("#deleteFileName").text(deletePrefix ? "everything under " + deletePrefix : "every object and version");
+            $("#deleteFilePath").text($("#jobProgress").data("bucket"));
+            $("#deleteModal").modal("show");
+        });
+
         $("#confirmDeleteBtn").click(function(){
             if(deleteForm) deleteForm.submit();
+            else if(deletePrefix !== null){
+                $("#deleteModal").modal("hide");
+                startJob("delete-url", { prefix: deletePrefix }, "Deleting " + (deletePrefix || "all objects"), deleteJobText);
+            }
+        });
+
+        // -------------------------
+        // Copy / move modal logic
+        // -------------------------
+        let copySource = null;
+        $(document).on("click", ".copyBtn", function(){
+            const key = $(this).attr("data-key");
+            copySource = key ? { key: key } : { prefix: $(this).attr("data-prefix") || "" };
+            $("#copySourceName").text(key || (copySource.prefix ? "everything under " + copySource.prefix : "every object in the bucket"));
+            $("#copyDestBucket").val($jobProgress.data("bucket"));
+            $("#copyDestPrefix").val("");
+            $("#copyMove").prop("checked", false);
+            $("#copyMoveModal").modal("show");
+        });
+
+        $("#confirmCopyBtn").click(function(){
+            if(!copySource) return;
+            const move = $("#copyMove").is(":checked");
+            $("#copyMoveModal").modal("hide");
+            startJob("copy-url", Object.assign({
+                dest_bucket: $("#copyDestBucket").val().trim(),
+                dest_prefix: $("#copyDestPrefix").val().trim(),
+                move: move
+            }, copySource), (move ? "Moving " : "Copying ") + (copySource.key || copySource.prefix || "all objects"), copyJobText);
+        });
+
+        // -------------------------
+        // Background jobs (delete, copy/move): start one, then poll its progress until it finishes
+        // -------------------------
+        const $jobProgress = $("#jobProgress");
+        let currentJobId = null;
+
+        function showJobStatus(text, cssClass){
+            $jobProgress.removeClass("d-none alert-warning alert-success alert-danger").addClass(cssClass);
+            $jobProgress.find(".job-status").text(text);
+        }
+
+        function failuresText(progress){
+            if(!progress.failed) return "";
+            const first = progress.failures[0] || {};
+            return ", " + progress.failed.toLocaleString() + " failed (e.g. " + first.Key + ": " + first.Message + ")";
+        }
+
+        function deleteJobText(progress){
+            return "Deleted " + (progress.deleted || 0).toLocaleString() + " of " + (progress.listed || 0).toLocaleString() + " listed" + failuresText(progress);
+        }
+
+        function copyJobText(progress){
+            let text = "Copied " + (progress.copied || 0).toLocaleString() + " of " + (progress.listed || 0).toLocaleString() + " listed (" + formatBytes(progress.bytes || 0) + ")";
+            if(progress.deleted) text += ", " + progress.deleted.toLocaleString() + " sources removed";
+            return text + failuresText(progress);
+        }
+
+        function formatBytes(bytes){
+            const units = ["B", "KB", "MB", "GB", "TB"];
+            let i = 0;
+            while(bytes >= 1024 && i < units.length - 1){ bytes /= 1024; i++; }
+            return bytes.toFixed(i ? 1 : 0) + " " + units[i];
+        }
+
+        function startJob(urlAttr, payload, label, describe){
+            postJSON($jobProgress.data(urlAttr), payload).done(function(res){
+                currentJobId = res.job_id;
+                $("#cancelJobBtn").show();
+                showJobStatus(label + "…", "alert-warning");
+                pollJob(describe);
+            }).fail(function(xhr){
+                showJobStatus(xhr.responseJSON?.message || "❌ Could not start the job.", "alert-danger");
+            });
+        }
+
+        function pollJob(describe){
+            $.getJSON($jobProgress.data("progress-url").replace("__id__", currentJobId)).done(function(res){
+                const job = res.job;
+                const progress = Object.assign({ failures: [] }, job.progress);
+                const text = describe(progress);
+                if(job.state === "queued" || job.state === "running"){
+                    showJobStatus(text + "…", "alert-warning");
+                    setTimeout(function(){ pollJob(describe); }, 1000);
+                    return;
+                }
+                $("#cancelJobBtn").hide();
+                if(job.state === "failed") showJobStatus("❌ " + text + ". " + job.error, "alert-danger");
+                else showJobStatus((job.state === "cancelled" ? "🛑 Stopped. " : "✅ ") + text + ". Reload to refresh the listing.", progress.failed ? "alert-danger" : "alert-success");
+            }).fail(function(){
+                setTimeout(function(){ pollJob(describe); }, 3000);
+            });
+        }
+
+        $("#cancelJobBtn").click(function(){
+            if(currentJobId) postJSON($jobProgress.data("cancel-url").replace("__id__", currentJobId), {});
         });
 
-    });
\ No newline at end of file
+    });
@@ -0,0 +1,9 @@
+import os
+import sys
+import tempfile
+
+# Modules create their sqlite files under database/ when imported; keep them out of the checkout
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+_workdir = tempfile.mkdtemp(prefix="s3-panel-tests-")
+os.makedirs(os.path.join(_workdir, "database"))
+os.chdir(_workdir)
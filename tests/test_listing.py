@@ -0,0 +1,157 @@
+import bisect
+import random
+import threading
+
+import pytest
+
+from helpers import listing, usage_index
+
+
+class FakeS3:
+    """list_objects_v2 over a sorted in-memory key list with S3 semantics."""
+
+    def __init__(self, keys, page=1000, fail_after=None):
+        self.keys = sorted(keys)
+        self.page = page
+        self.fail_after = fail_after
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def list_objects_v2(self, Bucket, Prefix="", Delimiter=None, StartAfter=None,
+                        ContinuationToken=None, MaxKeys=None):
+        with self.lock:
+            self.calls += 1
+            if self.fail_after is not None and self.calls > self.fail_after:
+                raise RuntimeError("listing failed")
+        start = ContinuationToken or StartAfter or ""
+        i = bisect.bisect_right(self.keys, start) if start else 0
+        i = max(i, bisect.bisect_left(self.keys, Prefix))
+        contents, prefixes, last = [], [], None
+        while i < len(self.keys) and len(contents) + len(prefixes) < (MaxKeys or self.page):
+            key = self.keys[i]
+            if not key.startswith(Prefix):
+                break
+            rest = key[len(Prefix):]
+            if Delimiter and Delimiter in rest:
+                common = Prefix + rest.split(Delimiter)[0] + Delimiter
+                prefixes.append({"Prefix": common})
+                last = common + listing._MAX_CHAR
+                i = bisect.bisect_right(self.keys, last)
+                continue
+            contents.append({"Key": key, "Size": len(key)})
+            last = key
+            i += 1
+        truncated = i < len(self.keys) and self.keys[i].startswith(Prefix)
+        response = {"Contents": contents, "CommonPrefixes": prefixes, "IsTruncated": truncated}
+        if truncated:
+            response["NextContinuationToken"] = last
+        return response
+
+
+_rng = random.Random(1)
+KEYSPACES = {
+    "empty": [],
+    "small": ["a", "b/c"],
+    "folders": [f"{a}/{b}/{i}" for a in "xyz" for b in range(5) for i in range(300)],
+    "flat": [f"{_rng.choice('abcXYZ019~-_')}{i:06d}" for i in range(6000)],
+    "one_folder_and_root_keys": [f"data/{i:06d}" for i in range(4000)] + ["data/", "zz"],
+    "non_ascii": [f"é{i}" for i in range(1500)] + [f"日本/{i}" for i in range(1500)]
+                 + [f"~{i}" for i in range(500)] + ["A/", "A/b", "\U0001f600"],
+}
+
+
+def _assert_listed_once(listed, expected):
+    assert len(listed) == len(set(listed))
+    assert sorted(listed) == sorted(expected)
+
+
+@pytest.mark.parametrize("name", KEYSPACES)
+@pytest.mark.parametrize("prefix", ["", "x/", "missing/"])
+def test_iter_objects_lists_every_key_once(name, prefix):
+    keys = KEYSPACES[name]
+    s3 = FakeS3(keys, page=100)
+    listed = [obj["Key"] for obj in listing.iter_objects(s3, "b", prefix, max_workers=4)]
+    _assert_listed_once(listed, [k for k in keys if k.startswith(prefix)])
+
+
+def test_small_listings_make_no_discovery_requests():
+    s3 = FakeS3(KEYSPACES["small"])
+    list(listing.iter_objects(s3, "b"))
+    assert s3.calls == 1
+
+
+@pytest.mark.parametrize("name", ["folders", "flat", "one_folder_and_root_keys", "non_ascii"])
+def test_shards_cover_the_keyspace_without_overlap(name):
+    keys = KEYSPACES[name]
+    s3 = FakeS3(keys, page=100)
+    shards = listing.plan_shards(s3, "b", max_shards=16)
+    assert 1 < len(shards) <= 16
+    assert shards[0][0] is None and shards[-1][1] is None
+    for (_, upto), (after, _) in zip(shards, shards[1:]):
+        assert upto == after
+
+    listed = []
+    for shard in shards:
+        for objects, _ in listing.list_shard_pages(s3, "b", "", shard):
+            after, upto = shard
+            assert all((after is None or o["Key"] > after) and (upto is None or o["Key"] <= upto) for o in objects)
+            listed.extend(o["Key"] for o in objects)
+    _assert_listed_once(listed, keys)
+
+
+def test_delimiter_folders_are_used_as_split_points():
+    s3 = FakeS3(KEYSPACES["folders"])
+    points = {upto for _, upto in listing.plan_shards(s3, "b", max_shards=64) if upto}
+    assert {"x/", "y/", "z/"} <= points
+
+
+def test_shard_resumes_after_a_checkpoint():
+    keys = KEYSPACES["flat"]
+    s3 = FakeS3(keys, page=100)
+    shard = listing.plan_shards(s3, "b", max_shards=4)[1]
+    in_shard = [k for k in sorted(keys) if (shard[0] is None or k > shard[0]) and (shard[1] is None or k <= shard[1])]
+    checkpoint = in_shard[len(in_shard) // 2]
+
+    resumed = [o["Key"] for objects, _ in listing.list_shard_pages(s3, "b", "", shard, start_after=checkpoint)
+               for o in objects]
+    assert resumed == [k for k in in_shard if k > checkpoint]
+
+
+def test_errors_in_shards_are_raised():
+    s3 = FakeS3(KEYSPACES["flat"], page=100, fail_after=20)
+    with pytest.raises(RuntimeError):
+        list(listing.iter_objects(s3, "b", max_workers=4))
+
+
+def test_closing_early_stops_listing():
+    s3 = FakeS3(KEYSPACES["flat"], page=100)
+    pages = listing.iter_pages(s3, "b", max_workers=4)
+    for _ in range(listing.LISTING_PROBE_PAGES + 2):
+        next(pages)
+    pages.close()
+    calls = s3.calls
+    threading.Event().wait(0.3)
+    assert s3.calls <= calls + 4
+
+
+@pytest.fixture
+def usage_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(usage_index, "USAGE_DB_FILE", str(tmp_path / "usage.db"))
+    usage_index.init_usage_db()
+
+
+@pytest.mark.parametrize("name", ["small", "flat", "non_ascii"])
+def test_scan_step_resumes_from_shard_checkpoints(usage_db, name):
+    keys = KEYSPACES[name]
+    s3 = FakeS3(keys, page=100)
+    usage_index.sync_buckets("AK", "http://e", ["b"])
+
+    steps = 1
+    while not usage_index.scan_step(s3, "AK", "http://e", "b", max_pages=2):
+        steps += 1
+        # Each step saves per-shard checkpoints and publishes nothing until the pass is complete
+        assert usage_index.get_bucket_usage("b", "AK", "http://e")["last_refreshed"] is None
+    usage = usage_index.get_bucket_usage("b", "AK", "http://e")
+    assert usage["total_objects"] == len(keys)
+    assert usage["total_size"] == sum(len(k) for k in keys)
+    assert (steps > 1) == (len(keys) > 100)
@@ -0,0 +1,75 @@
+import time
+
+from helpers.s3_select import scan_ranges, run_parallel, list_prefix_keys, SELECT_BUFFERED_EVENTS
+
+
+class PagedS3:
+    """Stub client whose list_objects_v2 paginator returns the given pages."""
+
+    def __init__(self, *pages):
+        self.pages = pages
+
+    def get_paginator(self, name):
+        pages = self.pages
+
+        class Paginator:
+            def paginate(self, **kwargs):
+                return iter(pages)
+
+        return Paginator()
+
+
+def _select_range(data, scan_range):
+    """Records S3 Select returns for a ScanRange: those starting within [Start, End]."""
+    start, end = scan_range
+    records, offset = [], 0
+    for line in data.splitlines(keepends=True):
+        if start <= offset <= end:
+            records.append(line)
+        offset += len(line)
+    return records
+
+
+def test_scan_ranges_do_not_overlap():
+    assert scan_ranges(10, 4) == [(0, 3), (4, 7), (8, 9)]
+    assert scan_ranges(8, 4) == [(0, 3), (4, 7)]
+
+
+def test_record_starting_on_a_boundary_is_returned_once():
+    data = b"a,1\nb,2\nc,3\nd,4\n"
+    # Every record is 4 bytes, so each one starts exactly on a range boundary
+    records = []
+    for scan_range in scan_ranges(len(data), 4):
+        records.extend(_select_range(data, scan_range))
+    assert records == data.splitlines(keepends=True)
+
+
+def test_jobs_ahead_buffer_a_bounded_number_of_events():
+    produced = {}
+
+    def job(index, count):
+        def events():
+            for n in range(count):
+                produced[index] = n + 1
+                yield {"type": "records", "data": f"{index}:{n}\n"}
+            yield {"type": "end"}
+        return events
+
+    events = run_parallel([job(0, 3), job(1, 1000)], max_workers=2)
+    try:
+        data = [next(events)["data"]]
+        # Job 1 runs ahead while job 0 is being relayed, but stops once its queue is full
+        time.sleep(0.2)
+        assert produced[1] <= SELECT_BUFFERED_EVENTS + 1
+
+        data += [event["data"] for event in events if event["type"] == "records"]
+        assert data == [f"0:{n}\n" for n in range(3)] + [f"1:{n}\n" for n in range(1000)]
+    finally:
+        events.close()
+
+
+def test_prefix_keys_report_truncation():
+    objects = [{"Key": f"k{i}", "Size": 1} for i in range(5)]
+    s3 = PagedS3({"Contents": [{"Key": "dir/", "Size": 0}] + objects[:3]}, {"Contents": objects[3:]})
+    assert list_prefix_keys(s3, "b", "", max_keys=5) == ([o["Key"] for o in objects], False)
+    assert list_prefix_keys(s3, "b", "", max_keys=4) == ([o["Key"] for o in objects[:4]], True)
@@ -0,0 +1,138 @@
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from helpers import usage_providers
+
+BUCKETS_XML = (
+    '<?xml version="1.0"?><ListAllMyBucketsResult><Owner><ID>o</ID></Owner><Buckets>'
+    '<Bucket><Name>b1</Name><CreationDate>2024-01-01T00:00:00Z</CreationDate></Bucket>'
+    '<Bucket><Name>b2</Name><CreationDate>2024-01-01T00:00:00Z</CreationDate></Bucket>'
+    '</Buckets></ListAllMyBucketsResult>'
+)
+
+
+class StubBackend:
+    """What the stub endpoint answers: which native usage sources it offers and its buckets."""
+
+    def __init__(self):
+        self.sources = set()
+        self.buckets_xml = BUCKETS_XML
+        self.head_stats = {"b1": (55, 5)}
+        self.delay = 0
+        self.requests = []
+
+
+def _handler(backend):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status, body=b"", headers=None):
+            self.send_response(status)
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            if self.command != "HEAD":
+                self.wfile.write(body)
+
+        def _dispatch(self):
+            path = self.path.split("?")[0]
+            backend.requests.append((self.command, path, self.headers.get("Authorization", "")))
+            time.sleep(backend.delay)
+            if self.command == "GET" and path == "/":
+                return self._send(200, backend.buckets_xml.encode(), {"Content-Type": "application/xml"})
+            if path == "/admin/bucket" and "rgw_admin" in backend.sources:
+                return self._send(200, json.dumps([
+                    {"bucket": "b1", "usage": {"rgw.main": {"size": 100, "num_objects": 3}}},
+                    {"bucket": "b2", "usage": {}},
+                    {"bucket": "someone-else", "usage": {"rgw.main": {"size": 1, "num_objects": 1}}},
+                ]).encode())
+            if path == "/minio/admin/v3/datausageinfo" and "minio_admin" in backend.sources:
+                return self._send(200, json.dumps({
+                    "bucketsUsageInfo": {"b1": {"size": 7, "objectsCount": 1}}
+                }).encode())
+            if self.command == "HEAD" and "rgw_head" in backend.sources:
+                stats = backend.head_stats.get(path.lstrip("/"))
+                if stats is None:
+                    return self._send(403)
+                return self._send(200, headers={"X-RGW-Bytes-Used": str(stats[0]), "X-RGW-Object-Count": str(stats[1])})
+            if self.command == "HEAD":
+                return self._send(200)
+            return self._send(403, b"<Error><Code>AccessDenied</Code></Error>")
+
+        do_GET = do_HEAD = _dispatch
+
+    return Handler
+
+
+@pytest.fixture
+def stub():
+    backend = StubBackend()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _handler(backend))
+    threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+    backend.endpoint_url = f"http://127.0.0.1:{server.server_port}"
+    usage_providers._provider_cache.clear()
+    yield backend
+    server.shutdown()
+    server.server_close()
+
+
+def test_requests_are_sigv4_signed(stub):
+    stub.sources = {"rgw_admin"}
+    usage_providers.fetch_usage("rgw_admin", "AK", "SK", stub.endpoint_url, ["b1"])
+    assert stub.requests[-1][2].startswith("AWS4-HMAC-SHA256 Credential=AK/")
+
+
+def test_rgw_admin_reports_only_the_accounts_buckets(stub):
+    stub.sources = {"rgw_admin"}
+    usage = usage_providers.fetch_usage("rgw_admin", "AK", "SK", stub.endpoint_url, ["b1", "b2"])
+    assert usage == {"b1": (100, 3), "b2": (0, 0)}
+
+
+def test_minio_leaves_out_unreported_buckets(stub):
+    stub.sources = {"minio_admin"}
+    usage = usage_providers.fetch_usage("minio_admin", "AK", "SK", stub.endpoint_url, ["b1", "b2"])
+    assert usage == {"b1": (7, 1)}
+
+
+def test_rgw_head_leaves_out_failing_buckets(stub):
+    stub.sources = {"rgw_head"}
+    usage = usage_providers.fetch_usage("rgw_head", "AK", "SK", stub.endpoint_url, ["b1", "b2"])
+    assert usage == {"b1": (55, 5)}
+
+
+@pytest.mark.parametrize("sources, expected", [
+    ({"rgw_admin", "rgw_head"}, "rgw_admin"),
+    ({"minio_admin"}, "minio_admin"),
+    ({"rgw_head"}, "rgw_head"),
+    (set(), usage_providers.LISTING),
+])
+def test_probe_detects_the_cheapest_source(stub, sources, expected):
+    stub.sources = sources
+    assert usage_providers.probe_usage_provider("AK", "SK", stub.endpoint_url) == expected
+    assert usage_providers.get_usage_provider("AK", "SK", stub.endpoint_url) == expected
+
+
+def test_listing_is_not_cached_without_a_bucket_to_probe(stub):
+    stub.buckets_xml = '<?xml version="1.0"?><ListAllMyBucketsResult><Buckets></Buckets></ListAllMyBucketsResult>'
+    stub.sources = {"rgw_head"}
+    assert usage_providers.probe_usage_provider("AK", "SK", stub.endpoint_url) == usage_providers.LISTING
+    assert not usage_providers._provider_cache
+
+
+def test_background_probe_does_not_block(stub):
+    stub.sources = {"rgw_admin"}
+    stub.delay = 0.3
+    started = time.monotonic()
+    usage_providers.probe_in_background("AK", "SK", stub.endpoint_url)
+    assert time.monotonic() - started < stub.delay
+
+    deadline = time.monotonic() + 5
+    while not usage_providers._provider_cache and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert usage_providers.get_usage_provider("AK", "SK", stub.endpoint_url) == "rgw_admin"